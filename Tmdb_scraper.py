@@ -1,14 +1,32 @@
-import requests
+import argparse
+import calendar
+import codecs
+import contextlib
+import importlib.util
 import random
-from bs4 import BeautifulSoup
+import hashlib
+import heapq
 import json
+import os
 import re
-import urllib3
-from urllib3.exceptions import InsecureRequestWarning
+import sys
+import sqlite3
+import tempfile
+import zlib
 import time
+from collections import OrderedDict, deque, namedtuple
+import threading
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from html.parser import HTMLParser
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from functools import partial
+from urllib.parse import urlencode, urlsplit
 
-# Disable SSL warnings
-urllib3.disable_warnings(InsecureRequestWarning)
+from compact_index import INDEX_PATH, fold_title, normalize_epg_title, write_compact_index
+
+# requests, urllib3 and bs4 are imported on first use, so importing this
+# module (say, when a plugin menu opens) stays cheap
 
 user_agents = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -20,482 +38,3101 @@ user_agents = [
 def get_random_ua():
     return random.choice(user_agents)
 
+# Request headers of every scraper; each scraper adds its own User-Agent
 headers = {
-    'User-Agent': get_random_ua(),
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
     'Accept-Language': 'en-US,en;q=0.9,ar-EG;q=0.8,ar;q=0.7',
     'Referer': 'https://www.themoviedb.org',
     'Connection': 'keep-alive',
 }
 
-def extract_title_from_card(card):
-    """Extract the main title from a movie card, handling different HTML structures"""
-    # Method 1: Try to find h2 tag directly
-    h2_tag = card.find('h2')
-    if h2_tag:
-        # Remove any span elements with class 'title' (alternative titles)
-        for span in h2_tag.find_all('span', class_='title'):
-            span.decompose()
-        title = h2_tag.get_text(strip=True)
-        if title:
-            return title
-    
-    # Method 2: Try to find the title in the a tag with class 'result'
-    a_tag = card.find('a', class_='result')
-    if a_tag:
-        # Remove any span elements with class 'title'
-        for span in a_tag.find_all('span', class_='title'):
-            span.decompose()
-        title = a_tag.get_text(strip=True)
-        if title:
-            return title
-    
-    # Method 3: Try to extract from img alt text
-    img_tag = card.find('img', class_='poster')
-    if img_tag and img_tag.has_attr('alt'):
-        return img_tag['alt']
-    
-    # Method 4: Try to extract from URL
-    a_tag = card.find('a', class_='result')
-    if a_tag and a_tag.has_attr('href'):
-        url_parts = a_tag['href'].split('/')
+BASE_URL = "https://www.themoviedb.org"
+
+# An element picked out of a page: tag name, classes it must all have, the
+# rule whose element it must sit in, whether every match is collected
+# instead of the first, and attributes it must have (True for presence, a
+# string for a substring of the value)
+Rule = namedtuple('Rule', ['tag', 'class_', 'within', 'many', 'attrs'], defaults=(None, None, False, None))
+
+def _rule_matches(rule, element):
+    if rule.class_:
+        classes = element.get('class') or ()
+        for class_ in rule.class_.split():
+            if class_ not in classes:
+                return False
+    if rule.attrs:
+        for name, expected in rule.attrs.items():
+            value = element.get(name)
+            if value is None or (expected is not True and expected not in value):
+                return False
+    return True
+
+def select_elements(root, rules, root_rule=None):
+    """Walk the subtree of root once, picking out the elements described by rules
+    
+    Returns a dict of rule name to the first matching element, or for a rule
+    with many=True to a list of (element, matches) pairs, where matches holds
+    the rules that sit inside that element. root itself counts as the
+    element of root_rule. The tree is not modified.
+    """
+    rules_by_tag = {}
+    for name, rule in rules.items():
+        rules_by_tag.setdefault(rule.tag, []).append((name, rule))
+    
+    found = {}
+    # Dict each rule's matches go into, by the name of the rule they sit in
+    scope = {None: found}
+    if root_rule is not None:
+        scope[root_rule] = found
+    
+    # Depth-first in document order, so the first match of a rule is kept
+    stack = [(child, scope) for child in reversed(root.contents) if not isinstance(child, str)]
+    while stack:
+        element, scope = stack.pop()
+        inner_scope = scope
+        for name, rule in rules_by_tag.get(element.name, ()):
+            target = scope.get(rule.within)
+            if target is None or not _rule_matches(rule, element):
+                continue
+            if rule.many:
+                matches = {}
+                target.setdefault(name, []).append((element, matches))
+            elif name not in target:
+                target[name] = element
+                matches = target
+            else:
+                continue
+            if inner_scope is scope:
+                inner_scope = dict(scope)
+            inner_scope[name] = matches
+        
+        stack.extend((child, inner_scope) for child in reversed(element.contents) if not isinstance(child, str))
+    
+    return found
+
+def extract_fields(matches, field_specs):
+    """Build a dict from picked elements, leaving out fields that come out empty"""
+    record = {}
+    for field_name, getter in field_specs:
+        value = getter(matches)
+        if value is not None and value != '':
+            record[field_name] = value
+    return record
+
+def extract_items(matches, name, field_specs):
+    """Build a dict for every element collected by a many=True rule"""
+    return [extract_fields(item_matches, field_specs) for _, item_matches in matches.get(name, [])]
+
+def text_of(name):
+    """Field getter returning the stripped text of a picked element"""
+    def get(matches):
+        element = matches.get(name)
+        return element.get_text(strip=True) if element is not None else None
+    return get
+
+def attribute_of(name, attribute):
+    """Field getter returning an attribute of a picked element"""
+    def get(matches):
+        element = matches.get(name)
+        return element.get(attribute) if element is not None else None
+    return get
+
+def _text_without_alternative_titles(element):
+    """Return the text of element leaving out the alternative title spans, without removing them"""
+    parts = []
+    for string in element.strings:
+        parent = string.parent
+        while parent is not element and not (parent.name == 'span' and 'title' in (parent.get('class') or ())):
+            parent = parent.parent
+        if parent is element and string.strip():
+            parts.append(string.strip())
+    return ''.join(parts)
+
+def _card_title(matches):
+    # The heading, then the result link, without the alternative title
+    for name in ('heading', 'link'):
+        element = matches.get(name)
+        if element is not None:
+            title = _text_without_alternative_titles(element)
+            if title:
+                return title
+    
+    # Then the poster alt text
+    poster = matches.get('poster')
+    if poster is not None and poster.has_attr('alt'):
+        return poster['alt']
+    
+    # Then the URL, like "/movie/1035259-the-naked-gun"
+    link = matches.get('link')
+    if link is not None and link.has_attr('href'):
+        url_parts = link['href'].split('/')
         if len(url_parts) > 2:
-            # Extract title from URL like "/movie/1035259-the-naked-gun"
             title_part = url_parts[-1]
-            # Remove ID part if present
             if '-' in title_part:
                 title_part = title_part.split('-', 1)[1]
-            # Replace hyphens with spaces and capitalize
             return title_part.replace('-', ' ').title()
     
     return "Unknown Title"
 
+def _card_poster_url(matches):
+    # Ask for a larger version of the poster than the search page shows
+    poster_url = attribute_of('poster', 'src')(matches)
+    if poster_url:
+        for size in ('w94_and_h141_bestv2', 'w130_and_h195_bestv2'):
+            if size in poster_url:
+                return poster_url.replace(size, 'w220_and_h330_face')
+    return poster_url
+
+def _card_adult_content(matches):
+    adult = attribute_of('link', 'data-media-adult')(matches)
+    return adult == 'true' if adult is not None else None
+
+def _card_tmdb_id(matches):
+    href = attribute_of('link', 'href')(matches)
+    match = re.search(r'/movie/(\d+)', href) if href else None
+    return match.group(1) if match else None
+
+def _youtube_url(matches):
+    youtube_id = attribute_of('play', 'data-id')(matches)
+    return f"https://www.youtube.com/watch?v={youtube_id}" if youtube_id is not None else None
+
+def _movie_overview(matches):
+    return text_of('overview_text')(matches) if 'overview_text' in matches else text_of('overview')(matches)
+
+def _movie_genres(matches):
+    if 'genres' not in matches:
+        return None
+    return [genre.get_text(strip=True) for genre, _ in matches.get('genre', [])]
+
+def _movie_director(matches):
+    for _, people in matches.get('people', []):
+        for _, person in people.get('person', []):
+            job = text_of('job')(person)
+            if job is not None and 'director' in job.lower():
+                if 'person_link' in person:
+                    return text_of('person_link')(person)
+                return text_of('person_name')(person)
+    return None
+
+# Elements and fields of a search result card
+CARD_RULES = {
+    'heading': Rule('h2', within='card'),
+    'link': Rule('a', 'result', within='card'),
+    'alternative_title': Rule('span', 'title', within='card'),
+    'poster': Rule('img', 'poster', within='card'),
+    'release_date': Rule('span', 'release_date', within='card'),
+    'overview': Rule('div', 'overview', within='card'),
+    'overview_text': Rule('p', within='overview'),
+}
+CARD_FIELDS = [
+    ('title', _card_title),
+    ('alternative_title', text_of('alternative_title')),
+    ('url', attribute_of('link', 'href')),
+    ('release_date', text_of('release_date')),
+    ('overview', text_of('overview_text')),
+    ('poster_url', _card_poster_url),
+    ('media_type', attribute_of('link', 'data-media-type')),
+    ('adult_content', _card_adult_content),
+    ('tmdb_id', _card_tmdb_id),
+]
+SEARCH_RULES = {'card': Rule('div', 'card', many=True), **CARD_RULES}
+
+# Elements and fields of a movie page
+MOVIE_RULES = {
+    'title': Rule('h2', 'title'),
+    'tagline': Rule('h3', 'tagline'),
+    'overview': Rule('div', 'overview'),
+    'overview_text': Rule('p', within='overview'),
+    'release_date': Rule('span', 'release'),
+    'runtime': Rule('span', 'runtime'),
+    'genres': Rule('span', 'genres'),
+    'genre': Rule('a', within='genres', many=True),
+    'rating': Rule('div', 'user_score_chart', attrs={'data-percent': True}),
+    'poster': Rule('img', 'poster'),
+    'people': Rule('ol', 'people', many=True),
+    'person': Rule('li', 'profile', within='people', many=True),
+    'job': Rule('p', 'job', within='person'),
+    'person_name': Rule('p', 'name', within='person'),
+    'person_link': Rule('a', within='person_name'),
+}
+MOVIE_FIELDS_SPEC = [
+    ('title', text_of('title')),
+    ('tagline', text_of('tagline')),
+    ('overview', _movie_overview),
+    ('release_date', text_of('release_date')),
+    ('runtime', text_of('runtime')),
+    ('genres', _movie_genres),
+    ('rating', attribute_of('rating', 'data-percent')),
+    ('poster_url', attribute_of('poster', 'src')),
+    ('director', _movie_director),
+]
+
+# Elements and fields of a trailer on the videos page
+VIDEO_RULES = {
+    'section': Rule('section', 'panel video'),
+    'video': Rule('div', 'video card default', within='section', many=True),
+    'play': Rule('a', 'play_trailer', within='video'),
+    'heading': Rule('h2', within='video'),
+    'sub': Rule('h3', 'sub', within='video'),
+    'channel': Rule('h4', within='video'),
+}
+TRAILER_FIELDS = [
+    ('youtube_id', attribute_of('play', 'data-id')),
+    ('youtube_url', _youtube_url),
+    ('title', text_of('heading')),
+    ('details', text_of('sub')),
+    ('site', attribute_of('play', 'data-site')),
+    ('channel', text_of('channel')),
+]
+
+# Elements and fields of a cast member on the cast page
+CAST_RULES = {
+    'section': Rule('section', 'panel pad'),
+    'member': Rule('li', within='section', many=True, attrs={'data-order': True}),
+    'info': Rule('div', 'info', within='member'),
+    'name_line': Rule('p', within='info'),
+    'name': Rule('a', within='name_line'),
+    'character': Rule('p', 'character', within='member'),
+    'profile': Rule('img', 'profile', within='member'),
+}
+CAST_FIELDS = [
+    ('name', text_of('name')),
+    ('character', text_of('character')),
+    ('profile_url', attribute_of('profile', 'src')),
+]
+
+def _image_rules(size):
+    """Rules picking the images of one size out of an images page"""
+    return {
+        'section': Rule('section', 'panel user_images'),
+        'image': Rule('img', within='section', many=True, attrs={'src': size}),
+    }
+
+# Images of each size on the logos, backdrops and posters pages
+LOGO_RULES = _image_rules('w500')
+BACKDROP_RULES = _image_rules('w500_and_h282_face')
+POSTER_RULES = _image_rules('w220_and_h330_face')
+
+def _card_movie(matches, base_url):
+    """Build a movie from the elements matched in one search result card"""
+    movie = extract_fields(matches, CARD_FIELDS)
+    if 'url' in movie:
+        movie['url'] = base_url + movie['url']
+    return movie
+
+def extract_card(card, base_url=BASE_URL):
+    """Extract every field of a search result card in one pass over it"""
+    return _card_movie(select_elements(card, CARD_RULES, 'card'), base_url)
+
+def extract_title_from_card(card):
+    """Extract the main title from a movie card, handling different HTML structures"""
+    return _card_title(select_elements(card, CARD_RULES, 'card'))
+
 def extract_alternative_title(card):
     """Extract alternative title if present"""
-    alt_title_span = card.find('span', class_='title')
-    if alt_title_span:
-        return alt_title_span.get_text(strip=True)
-    return None
+    return text_of('alternative_title')(select_elements(card, CARD_RULES, 'card')) or None
 
 def extract_poster_url(card):
     """Extract poster URL and try to get higher resolution"""
-    img_tag = card.find('img', class_='poster')
-    if img_tag and img_tag.has_attr('src'):
-        poster_url = img_tag['src']
-        # Try to get a larger version of the poster
-        if 'w94_and_h141_bestv2' in poster_url:
-            return poster_url.replace('w94_and_h141_bestv2', 'w220_and_h330_face')
-        elif 'w130_and_h195_bestv2' in poster_url:
-            return poster_url.replace('w130_and_h195_bestv2', 'w220_and_h330_face')
-        return poster_url
-    return None
+    return _card_poster_url(select_elements(card, CARD_RULES, 'card'))
 
 def extract_tmdb_id(card):
     """Extract TMDB ID from the card"""
-    a_tag = card.find('a', class_='result')
-    if a_tag and a_tag.has_attr('href'):
-        href = a_tag['href']
-        # Extract ID from URL like "/movie/1035259-the-naked-gun"
-        match = re.search(r'/movie/(\d+)', href)
-        if match:
-            return match.group(1)
-    return None
+    return _card_tmdb_id(select_elements(card, CARD_RULES, 'card'))
 
-def scrape_tmdb_movies(movie_title):
-    """Scrape TMDB for movies matching the search title"""
-    # Prepare the search query
-    title = movie_title.replace(' ', '+').lower()
-    url = f"https://www.themoviedb.org/search?query={title}"
+# Tree builder for BeautifulSoup: 'selectolax', 'lxml', 'html.parser' or None to pick the fastest installed
+PARSER_BACKEND = None
+
+# The only part of each page type that is parsed; everything else in the document is skipped
+PAGE_REGIONS = {
+    'search': ('div', 'card'),
+    'logos': ('section', 'panel user_images'),
+    'backdrops': ('section', 'panel user_images'),
+    'posters': ('section', 'panel user_images'),
+    'videos': ('section', 'panel video'),
+    'cast': ('section', 'panel pad'),
+}
+
+def _module_available(module_name):
+    """Return whether a module is installed, without importing it"""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+def get_parser_backend(preferred=None):
+    """Return the parser backend to use, falling back to html.parser"""
+    if preferred == 'selectolax' and _module_available('selectolax.lexbor'):
+        return 'selectolax'
+    if preferred in (None, 'selectolax', 'lxml') and _module_available('lxml'):
+        return 'lxml'
+    if preferred is None and _module_available('selectolax.lexbor'):
+        return 'selectolax'
+    return 'html.parser'
+
+def _region_selector(region):
+    """Build the CSS selector for a (tag, class) region"""
+    name, class_ = region
+    return name + ''.join('.' + value for value in class_.split())
+
+def _region_strainer(region):
+    """Build a SoupStrainer matching a (tag, class) region like find() does"""
+    from bs4 import SoupStrainer
     
-    # Make the request
-    response = requests.get(url, headers=headers, verify=False, timeout=10)
-    response.raise_for_status()
+    name, class_ = region
+    if ' ' in class_:
+        # A class string with spaces has to match the whole attribute value
+        pattern = re.compile('^' + re.escape(class_) + '$')
+    else:
+        pattern = re.compile(r'(^|\s)' + re.escape(class_) + r'(\s|$)')
+    return SoupStrainer(name, attrs={'class': pattern})
+
+def _select_region_html(html, region):
+    """Cut the outermost region elements out of a page with the lexbor engine"""
+    from selectolax.lexbor import LexborHTMLParser
     
-    # Parse the HTML
-    soup = BeautifulSoup(response.text, 'html.parser')
+    fragments = []
+    matched = set()
+    for node in LexborHTMLParser(html).css(_region_selector(region)):
+        # Skip regions nested in a region that was already taken
+        parent = node.parent
+        nested = False
+        while parent is not None:
+            if parent.mem_id in matched:
+                nested = True
+                break
+            parent = parent.parent
+        if not nested:
+            matched.add(node.mem_id)
+            fragments.append(node.html)
+    return ''.join(fragments)
+
+def parse_html(html, backend=None, region=None):
+    """Parse a page into a BeautifulSoup tree
     
-    # Find all movie cards
-    movie_cards = soup.find_all('div', class_='card')
+    When a (tag, class) region is given only the matching elements are
+    built into the tree: selectolax cuts them out of the document before
+    BeautifulSoup sees it, the other backends use a SoupStrainer. The full
+    page is parsed when the region is not found.
+    """
+    from bs4 import BeautifulSoup
     
-    movies_data = []
+    backend = get_parser_backend(backend)
+    builder = 'html.parser' if backend == 'html.parser' else get_parser_backend('lxml')
     
-    for card in movie_cards:
-        # Extract movie data
-        movie = {}
-        
-        # Extract title
-        movie['title'] = extract_title_from_card(card)
-        
-        # Extract alternative title
-        alt_title = extract_alternative_title(card)
-        if alt_title:
-            movie['alternative_title'] = alt_title
-        
-        # Extract URL
-        a_tag = card.find('a', class_='result')
-        if a_tag and a_tag.has_attr('href'):
-            movie['url'] = "https://www.themoviedb.org" + a_tag['href']
-        
-        # Extract release date
-        release_date = card.find('span', class_='release_date')
-        if release_date:
-            movie['release_date'] = release_date.get_text(strip=True)
-        
-        # Extract overview
-        overview = card.find('div', class_='overview')
-        if overview and overview.find('p'):
-            movie['overview'] = overview.find('p').get_text(strip=True)
-        
-        # Extract poster URL
-        poster_url = extract_poster_url(card)
-        if poster_url:
-            movie['poster_url'] = poster_url
-        
-        # Extract media type and adult content
-        if a_tag and a_tag.has_attr('data-media-type'):
-            movie['media_type'] = a_tag['data-media-type']
-        
-        if a_tag and a_tag.has_attr('data-media-adult'):
-            movie['adult_content'] = a_tag['data-media-adult'] == 'true'
-        
-        # Extract TMDB ID
-        tmdb_id = extract_tmdb_id(card)
-        if tmdb_id:
-            movie['tmdb_id'] = tmdb_id
-        
-        movies_data.append(movie)
+    if region is not None:
+        if backend == 'selectolax':
+            fragment = _select_region_html(html, region)
+            if fragment:
+                return BeautifulSoup(fragment, builder)
+        else:
+            soup = BeautifulSoup(html, builder, parse_only=_region_strainer(region))
+            if soup.find(region[0]):
+                return soup
     
-    return movies_data
+    return BeautifulSoup(html, builder)
+
+def iter_search_results(soup, base_url=BASE_URL):
+    """Yield the movie cards of a parsed search results page one at a time"""
+    for _, matches in select_elements(soup, SEARCH_RULES).get('card', []):
+        yield _card_movie(matches, base_url)
+
+def parse_search_results(soup, base_url=BASE_URL):
+    """Extract the movie cards from a parsed search results page"""
+    return list(iter_search_results(soup, base_url))
 
-def scrape_movie_logos(movie_url):
-    """Scrape logo images from the movie's logos page"""
-    logos_url = movie_url + "/images/logos"
+# Cast members kept from the cast page unless a call asks for another number
+CAST_LIMIT = 6
+
+def _image_urls(soup, rules, limit=None):
+    return [image['src'] for image, _ in select_elements(soup, rules).get('image', [])][:limit]
+
+def parse_movie_logos(soup, limit=None):
+    """Extract logo image URLs from a parsed logos page"""
+    return _image_urls(soup, LOGO_RULES, limit)
+
+def parse_movie_backdrops(soup, limit=None):
+    """Extract backdrop image URLs from a parsed backdrops page"""
+    return _image_urls(soup, BACKDROP_RULES, limit)
+
+def parse_movie_posters(soup, limit=None):
+    """Extract additional poster image URLs from a parsed posters page"""
+    return _image_urls(soup, POSTER_RULES, limit)
+
+def parse_movie_trailers(soup, limit=None):
+    """Extract trailer videos from a parsed videos page"""
+    trailers = extract_items(select_elements(soup, VIDEO_RULES), 'video', TRAILER_FIELDS)
+    return [trailer for trailer in trailers if trailer][:limit]
+
+def parse_movie_cast(soup, limit=CAST_LIMIT):
+    """Extract the first limit cast members from a parsed cast page"""
+    matches = select_elements(soup, CAST_RULES)
+    if 'section' not in matches:
+        print("No cast section found")
+        return []
     
-    try:
-        # Add a small delay to avoid overwhelming the server
-        time.sleep(0.5)
-        
-        # Make the request
-        response = requests.get(logos_url, headers=headers, verify=False, timeout=10)
-        response.raise_for_status()
-        
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find the section with logos
-        logos_section = soup.find('section', class_='panel user_images')
-        if not logos_section:
-            return []
-        
-        # Find all logo images
-        logo_images = []
-        logo_elements = logos_section.select('img[src*="w500"]')
-        
-        for logo_element in logo_elements:
-            if logo_element.has_attr('src'):
-                logo_url = logo_element['src']
-                logo_images.append(logo_url)
+    cast = []
+    for i, actor in enumerate(extract_items(matches, 'member', CAST_FIELDS)[:limit]):
+        # Only add if we have at least a name
+        if actor.get('name'):
+            cast.append(actor)
+        else:
+            print(f"No name found for cast member {i}")
+    
+    return cast
+
+def parse_movie_page(soup):
+    """Extract detailed information from a parsed movie page"""
+    return extract_fields(select_elements(soup, MOVIE_RULES), MOVIE_FIELDS_SPEC)
+
+# Items counted on each section-only page when a streamed download stops early
+STREAM_ITEMS = {
+    'logos': LOGO_RULES['image'],
+    'backdrops': BACKDROP_RULES['image'],
+    'posters': POSTER_RULES['image'],
+    'videos': VIDEO_RULES['video'],
+    'cast': CAST_RULES['member'],
+}
+
+# Bytes read from the socket at a time in streamed downloads
+STREAM_CHUNK_SIZE = 16 * 1024
+
+class SectionScanner(HTMLParser):
+    """Incremental parser finding where the wanted region of a page ends
+    
+    Fed a page chunk by chunk as it downloads, it notes where the first
+    (tag, class) region starts and becomes done once that region has
+    closed or, with an item rule and limit, once one item more than the
+    limit has started. fragment() returns the region's HTML read so far,
+    or the whole text when the region never showed up.
+    """
+    
+    def __init__(self, region, item_rule=None, limit=None):
+        super().__init__(convert_charrefs=False)
+        self.region_rule = Rule(*region)
+        self.item_rule = item_rule
+        self.limit = limit
+        self.chunks = []
+        self.line_starts = [0]
+        self.length = 0
+        self.start = None
+        self.end = None
+        self.depth = 0
+        self.items = 0
+    
+    @property
+    def done(self):
+        return self.end is not None
+    
+    def feed(self, data):
+        for match in re.finditer('\n', data):
+            self.line_starts.append(self.length + match.end())
+        self.chunks.append(data)
+        self.length += len(data)
+        super().feed(data)
+    
+    def _offset(self):
+        """Offset in the page of the tag being handled"""
+        line, column = self.getpos()
+        return self.line_starts[line - 1] + column
+    
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        attributes = dict(attrs)
+        attributes['class'] = (attributes.get('class') or '').split()
         
-        return logo_images
+        if self.start is None:
+            if tag == self.region_rule.tag and _rule_matches(self.region_rule, attributes):
+                self.start = self._offset()
+                self.depth = 1
+            return
         
-    except Exception as e:
-        print(f"Error scraping logos: {e}")
-        return []
-
-def scrape_movie_backdrops(movie_url):
-    """Scrape backdrop images from the movie's backdrops page"""
-    backdrops_url = movie_url + "/images/backdrops"
+        if tag == self.region_rule.tag:
+            self.depth += 1
+        if self.item_rule is not None and tag == self.item_rule.tag and _rule_matches(self.item_rule, attributes):
+            self.items += 1
+            if self.limit is not None and self.items > self.limit:
+                self.end = self._offset()
+    
+    def handle_endtag(self, tag):
+        if self.start is None or self.done or tag != self.region_rule.tag:
+            return
+        self.depth -= 1
+        if self.depth == 0:
+            self.end = self._offset()
     
+    def fragment(self):
+        text = ''.join(self.chunks)
+        if self.start is None:
+            return text
+        return text[self.start:self.end]
+
+# Sub-pages scraped for every movie: details key, URL suffix and parser
+MOVIE_SUBPAGES = [
+    ('logo_urls', "/images/logos", parse_movie_logos),
+    ('backdrop_urls', "/images/backdrops", parse_movie_backdrops),
+    ('additional_poster_urls', "/images/posters", parse_movie_posters),
+    ('trailers', "/videos?active_nav_item=Trailers", parse_movie_trailers),
+    ('cast', "/cast", parse_movie_cast),
+]
+
+# Sub-page lookup by details key, and every page of a movie in fetch order
+MOVIE_SUBPAGE_INDEX = {key: (suffix, parser) for key, suffix, parser in MOVIE_SUBPAGES}
+
+# Items kept from each sub-page in the movie details
+MOVIE_PAGE_LIMITS = {'cast': CAST_LIMIT}
+MOVIE_PAGES = ['main'] + [key for key, _, _ in MOVIE_SUBPAGES]
+
+# Maximum number of pages fetched at the same time for a single movie
+DETAIL_CONCURRENCY = 6
+
+# Where main() keeps its page cache; override with TMDB_CACHE_PATH
+CACHE_PATH = os.environ.get('TMDB_CACHE_PATH') or os.path.join(os.path.expanduser('~'), '.cache', 'tmdb_scraper.db')
+
+# Upper bound for the page cache on disk, least recently used pages go first
+CACHE_MAX_BYTES = 20 * 1024 * 1024
+
+# Cache hits whose access times are kept in memory before they are written in one transaction
+CACHE_ACCESS_BATCH = 256
+
+# How long a cached page is served without asking the server, per page type
+PAGE_TTLS = {
+    'search': 6 * 3600,
+    'movie': 24 * 3600,
+    'logos': 7 * 24 * 3600,
+    'backdrops': 7 * 24 * 3600,
+    'posters': 7 * 24 * 3600,
+    'videos': 3 * 24 * 3600,
+    'cast': 7 * 24 * 3600,
+    'other': 3600,
+}
+
+# Query parameters holding credentials, masked wherever a URL is recorded, printed or used as a cache key
+CREDENTIAL_PARAMETERS = re.compile(r'\b(api_key=)[^&#\s\'"]+')
+
+def redact_url(text):
+    """Mask the credentials in a URL, or in a message quoting one"""
+    return CREDENTIAL_PARAMETERS.sub(r'\1REDACTED', text)
+
+def _redact_error(error):
+    """Mask the credentials in the message of an exception, in place"""
+    message = str(error)
+    redacted = redact_url(message)
+    if redacted != message:
+        error.args = (redacted,)
+    return error
+
+def raise_for_status(response):
+    """Raise the HTTP error of a response, with credentials masked in its message"""
     try:
-        # Add a small delay to avoid overwhelming the server
-        time.sleep(0.5)
-        
-        # Make the request
-        response = requests.get(backdrops_url, headers=headers, verify=False, timeout=10)
         response.raise_for_status()
-        
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find the section with backdrops
-        backdrops_section = soup.find('section', class_='panel user_images')
-        if not backdrops_section:
-            return []
-        
-        # Find all backdrop images with w500_and_h282_face size
-        backdrop_images = []
-        backdrop_elements = backdrops_section.select('img[src*="w500_and_h282_face"]')
-        
-        for backdrop_element in backdrop_elements:
-            if backdrop_element.has_attr('src'):
-                backdrop_url = backdrop_element['src']
-                backdrop_images.append(backdrop_url)
-        
-        return backdrop_images
-        
     except Exception as e:
-        print(f"Error scraping backdrops: {e}")
-        return []
+        _redact_error(e)
+        raise
 
-def scrape_movie_posters(movie_url):
-    """Scrape additional poster images from the movie's posters page"""
-    posters_url = movie_url + "/images/posters"
+def classify_url(url):
+    """Return the page type of a TMDB URL (search, movie, logos, cast, ...)"""
+    path = urlsplit(url).path.rstrip('/')
+    if path.startswith(('/search', '/3/search')):
+        return 'search'
+    if path.endswith('/images/logos'):
+        return 'logos'
+    if path.endswith('/images/backdrops'):
+        return 'backdrops'
+    if path.endswith('/images/posters'):
+        return 'posters'
+    if path.endswith('/videos'):
+        return 'videos'
+    if path.endswith('/cast'):
+        return 'cast'
+    if re.match(r'^(/3)?/movie/\d+[^/]*$', path):
+        return 'movie'
+    return 'other'
+
+class CachedResponse:
+    """A page served from the HTTP cache, usable in place of a requests response"""
     
-    try:
-        # Add a small delay to avoid overwhelming the server
-        time.sleep(0.5)
-        
-        # Make the request
-        response = requests.get(posters_url, headers=headers, verify=False, timeout=10)
-        response.raise_for_status()
-        
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find the section with posters
-        posters_section = soup.find('section', class_='panel user_images')
-        if not posters_section:
+    from_cache = True
+    status_code = 200
+    
+    def __init__(self, url, content, encoding, etag, last_modified, fetched):
+        self.url = url
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = fetched
+        self.headers = {}
+        if etag:
+            self.headers['ETag'] = etag
+        if last_modified:
+            self.headers['Last-Modified'] = last_modified
+    
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+    
+    def raise_for_status(self):
+        pass
+    
+    def validators(self):
+        """Return the conditional request headers used to revalidate this page"""
+        validators = {}
+        if self.etag:
+            validators['If-None-Match'] = self.etag
+        if self.last_modified:
+            validators['If-Modified-Since'] = self.last_modified
+        return validators
+
+class HttpCache:
+    """Persistent page cache stored in a single SQLite file
+    
+    Pages are keyed by URL and stay fresh for the TTL of their page type.
+    Expired pages are kept so they can be revalidated with their ETag or
+    Last-Modified date, and the least recently used pages are evicted once
+    the cache grows beyond max_bytes. A hit only notes its access time in
+    memory; the times are written in one transaction with the next store,
+    after CACHE_ACCESS_BATCH hits or on close, so a warm run barely writes.
+    """
+    
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, ttls=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(PAGE_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._accessed = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'url TEXT PRIMARY KEY, body BLOB, encoding TEXT, etag TEXT, '
+            'last_modified TEXT, fetched REAL, accessed REAL, size INTEGER)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)')
+        self._db.commit()
+        self.total_bytes = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+    
+    def close(self):
+        with self._lock:
+            self._flush_accessed()
+            self._db.commit()
+            self._db.close()
+    
+    def _flush_accessed(self):
+        """Write the pending access times, leaving the commit to the caller"""
+        if self._accessed:
+            self._db.executemany('UPDATE pages SET accessed = ? WHERE url = ?',
+                                 [(accessed, url) for url, accessed in self._accessed.items()])
+            self._accessed.clear()
+    
+    def is_fresh(self, url, fetched):
+        """Check whether a page fetched at the given time is still within its TTL"""
+        return time.time() - fetched < self.ttls.get(classify_url(url), self.ttls['other'])
+    
+    def get(self, url):
+        """Return the cached page for a URL, or None when it is not cached"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT body, encoding, etag, last_modified, fetched FROM pages WHERE url = ?',
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._accessed[url] = time.time()
+            if len(self._accessed) >= CACHE_ACCESS_BATCH:
+                self._flush_accessed()
+                self._db.commit()
+        
+        body, encoding, etag, last_modified, fetched = row
+        return CachedResponse(url, zlib.decompress(body), encoding, etag, last_modified, fetched)
+    
+    def store(self, url, response):
+        """Store a successful response, evicting old pages when over budget"""
+        body = zlib.compress(response.content)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT size FROM pages WHERE url = ?', (url,)).fetchone()
+            if row:
+                self.total_bytes -= row[0]
+            self._db.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, body, response.encoding, response.headers.get('ETag'),
+                 response.headers.get('Last-Modified'), now, now, len(body)),
+            )
+            self.total_bytes += len(body)
+            self._accessed.pop(url, None)
+            self._flush_accessed()
+            self._evict()
+            self._db.commit()
+    
+    def refresh(self, url, response):
+        """Mark a page as fresh again after the server answered 304 Not Modified"""
+        with self._lock:
+            now = time.time()
+            self._accessed.pop(url, None)
+            self._flush_accessed()
+            self._db.execute(
+                'UPDATE pages SET fetched = ?, accessed = ?, '
+                'etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?',
+                (now, now, response.headers.get('ETag'), response.headers.get('Last-Modified'), url),
+            )
+            self._db.commit()
+    
+    def _evict(self):
+        """Drop least recently used pages until the cache fits in max_bytes"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        rows = self._db.execute('SELECT url, size FROM pages ORDER BY accessed').fetchall()
+        for url, size in rows:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._db.execute('DELETE FROM pages WHERE url = ?', (url,))
+            self.total_bytes -= size
+    
+    def clear(self):
+        """Remove every cached page"""
+        with self._lock:
+            self._accessed.clear()
+            self._db.execute('DELETE FROM pages')
+            self._db.commit()
+            self._db.execute('VACUUM')
+            self.total_bytes = 0
+
+def movie_id_from_url(movie_url):
+    """Return the TMDB ID of a movie URL, or the URL itself when it has none"""
+    match = re.search(r'/movie/(\d+)', movie_url)
+    return match.group(1) if match else movie_url
+
+def keep_search_title(record, movie):
+    """Keep the search card title of movie as search_title when the details merged into record renamed it"""
+    if movie.get('title') and record.get('title') != movie['title']:
+        record['search_title'] = movie['title']
+    return record
+
+def assemble_details(results):
+    """Merge the parsed pages of a movie into the details dict"""
+    details = dict(results['main'])
+    
+    # Keep the director last, as before the sub-pages were added
+    director = details.pop('director', None)
+    
+    # Merge the sub-page results in their usual order
+    for key, _, _ in MOVIE_SUBPAGES:
+        if results.get(key):
+            details[key] = results[key]
+    
+    if director:
+        details['director'] = director
+    
+    return details
+
+# Page that provides each details field
+FIELD_PAGES = {
+    'title': 'main',
+    'tagline': 'main',
+    'overview': 'main',
+    'release_date': 'main',
+    'runtime': 'main',
+    'genres': 'main',
+    'rating': 'main',
+    'poster_url': 'main',
+    'director': 'main',
+}
+FIELD_PAGES.update({key: key for key, _, _ in MOVIE_SUBPAGES})
+
+def plan_pages(fields):
+    """Return the pages needed to fill the given details fields, in fetch order"""
+    unknown = set(fields) - set(FIELD_PAGES)
+    if unknown:
+        raise ValueError(f"Unknown movie fields: {', '.join(sorted(unknown))}")
+    needed = {FIELD_PAGES[field] for field in fields}
+    return [page for page in MOVIE_PAGES if page in needed]
+
+class LazyMovie:
+    """Movie details whose pages are fetched on first access and then kept
+    
+    Only the pages behind the fields that are actually read get requested,
+    so reading the rating and poster of a movie costs one request instead
+    of six. Passing fields fetches the pages they need up front, at the
+    same time.
+    """
+    
+    def __init__(self, scraper, movie_url, fields=None):
+        self.scraper = scraper
+        self.url = movie_url
+        self._pages = {}
+        self._lock = threading.Lock()
+        if fields:
+            self.load(fields)
+    
+    def load(self, fields=None):
+        """Fetch the pages behind fields (all fields by default) that are not loaded yet"""
+        pages = plan_pages(fields) if fields is not None else list(MOVIE_PAGES)
+        with self._lock:
+            pages = [page for page in pages if page not in self._pages]
+            results, errors = self.scraper.scrape_movie_pages(self.url, pages)
+            self._pages.update(results)
+        
+        for page, error in errors.items():
+            print(f"Error scraping {page}: {error}")
+    
+    def get(self, field, default=None):
+        """Return a details field, fetching its page first if needed"""
+        if field not in FIELD_PAGES:
+            raise ValueError(f"Unknown movie field: {field}")
+        page = FIELD_PAGES[field]
+        if page not in self._pages:
+            self.load([field])
+        
+        value = self._pages.get(page)
+        if page == 'main':
+            value = value.get(field) if value else None
+        return value if value else default
+    
+    @property
+    def logos(self):
+        return self.get('logo_urls', [])
+    
+    @property
+    def backdrops(self):
+        return self.get('backdrop_urls', [])
+    
+    @property
+    def posters(self):
+        return self.get('additional_poster_urls', [])
+    
+    @property
+    def trailers(self):
+        return self.get('trailers', [])
+    
+    @property
+    def cast(self):
+        return self.get('cast', [])
+    
+    def to_dict(self):
+        """Return the loaded fields in the same shape as scrape_movie_details"""
+        with self._lock:
+            pages = dict(self._pages)
+        pages.setdefault('main', {})
+        return assemble_details(pages)
+
+# Slotted dataclasses need Python 3.10, older ones get plain dataclasses
+DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+def _intern(value):
+    """Intern a short, often repeated string (genre, site, channel) so records share one copy"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+@dataclass(**DATACLASS_OPTIONS)
+class Trailer:
+    youtube_id: str = None
+    youtube_url: str = None
+    title: str = None
+    details: str = None
+    site: str = None
+    channel: str = None
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            youtube_id=data.get('youtube_id'),
+            youtube_url=data.get('youtube_url'),
+            title=data.get('title'),
+            details=data.get('details'),
+            site=_intern(data.get('site')),
+            channel=_intern(data.get('channel')),
+        )
+    
+    def to_dict(self):
+        return _fields_to_dict(self)
+
+@dataclass(**DATACLASS_OPTIONS)
+class CastMember:
+    name: str = None
+    character: str = None
+    profile_url: str = None
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(name=data.get('name'), character=data.get('character'), profile_url=data.get('profile_url'))
+    
+    def to_dict(self):
+        return _fields_to_dict(self)
+
+@dataclass(**DATACLASS_OPTIONS)
+class ImageSet:
+    logo_urls: tuple = ()
+    backdrop_urls: tuple = ()
+    additional_poster_urls: tuple = ()
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            logo_urls=tuple(data.get('logo_urls') or ()),
+            backdrop_urls=tuple(data.get('backdrop_urls') or ()),
+            additional_poster_urls=tuple(data.get('additional_poster_urls') or ()),
+        )
+    
+    def to_dict(self):
+        return {key: list(value) for key, value in _iter_fields(self) if value}
+
+@dataclass(**DATACLASS_OPTIONS)
+class Movie:
+    """A search result and its details in one compact record
+    
+    Fields are slots instead of per-record dict keys, image lists are tuples
+    and genre, site and channel strings are interned. A search card takes
+    about 40% less memory than the plain dict; a fully detailed movie only
+    about 20% less, as its image and cast URLs make up most of it. update()
+    merges a details dict into the record in place, and to_dict() and
+    from_dict() convert to and from the dicts the scraper returns and saves
+    as JSON, keeping their key order. Keys the model does not know are kept
+    in extra.
+    """
+    
+    title: str = None
+    alternative_title: str = None
+    url: str = None
+    release_date: str = None
+    overview: str = None
+    poster_url: str = None
+    media_type: str = None
+    adult_content: bool = None
+    tmdb_id: str = None
+    tagline: str = None
+    runtime: str = None
+    genres: tuple = ()
+    rating: str = None
+    images: ImageSet = field(default_factory=ImageSet)
+    trailers: tuple = ()
+    cast: tuple = ()
+    director: str = None
+    extra: dict = None
+    
+    @classmethod
+    def from_dict(cls, data):
+        movie = cls()
+        movie.update(data)
+        return movie
+    
+    def update(self, data):
+        """Merge a search result or details dict into the record, later values winning"""
+        for key, value in data.items():
+            if key in MOVIE_IMAGE_FIELDS:
+                setattr(self.images, key, tuple(value or ()))
+            elif key == 'trailers':
+                self.trailers = tuple(Trailer.from_dict(trailer) for trailer in value)
+            elif key == 'cast':
+                self.cast = tuple(CastMember.from_dict(actor) for actor in value)
+            elif key == 'genres':
+                self.genres = tuple(_intern(genre) for genre in value)
+            elif key == 'media_type':
+                self.media_type = _intern(value)
+            elif key in MOVIE_FIELDS:
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+        return self
+    
+    def to_dict(self):
+        """Return the record as the dict the scraper returns, without empty fields"""
+        data = {}
+        for key, value in _iter_fields(self):
+            if key == 'images':
+                data.update(value.to_dict())
+            elif key in ('trailers', 'cast'):
+                if value:
+                    data[key] = [item.to_dict() for item in value]
+            elif key == 'genres':
+                if value:
+                    data[key] = list(value)
+            elif key == 'extra':
+                data.update(value or {})
+            elif value is not None:
+                data[key] = value
+        return data
+
+def _iter_fields(record):
+    for record_field in fields(record):
+        yield record_field.name, getattr(record, record_field.name)
+
+def _fields_to_dict(record):
+    return {key: value for key, value in _iter_fields(record) if value is not None}
+
+# Field names of Movie and ImageSet, used when merging dicts into a Movie
+MOVIE_FIELDS = frozenset(record_field.name for record_field in fields(Movie))
+MOVIE_IMAGE_FIELDS = frozenset(record_field.name for record_field in fields(ImageSet))
+
+# Finished movies whose pages a CrawlState keeps for later titles resolving to them
+FINISHED_MOVIES_KEPT = 256
+
+class CrawlState:
+    """Checkpoint of a long crawl, kept as an append-only JSON Lines file
+    
+    Each job (a search title in batch mode, a tmdb_id in 'all' mode) records
+    the movie it resolved to, every page of that movie that was parsed
+    (keyed by tmdb_id) and finally that it is done. Replaying the file after
+    a crash lets a restarted crawl skip finished jobs and fetch only the
+    pages that are still missing. Failed pages are never recorded, so they
+    are retried.
+    
+    Several jobs can resolve to the same movie (EPG titles often do), so the
+    pages of a movie stay in pages while any unfinished job uses it. Once
+    the last one is done they move to finished, which keeps the most recent
+    FINISHED_MOVIES_KEPT movies so later titles for them need no requests.
+    """
+    
+    def __init__(self, path, keep_results=False):
+        self.path = path
+        self.keep_results = keep_results
+        self.movies = {}
+        self.pages = {}
+        self.finished = OrderedDict()
+        self.done = set()
+        self.results = {}
+        self._users = {}
+        self._lock = threading.Lock()
+        self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+    
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short by the crash
+                    continue
+                self._apply(entry)
+    
+    def _apply(self, entry):
+        if 'page' in entry:
+            self._use(entry['tmdb_id'])[entry['page']] = entry['value']
+        elif 'movie' in entry:
+            self.movies[entry['job']] = entry['movie']
+            if entry['movie'] and 'url' in entry['movie']:
+                tmdb_id = movie_id_from_url(entry['movie']['url'])
+                self._users.setdefault(tmdb_id, set()).add(entry['job'])
+                self._use(tmdb_id)
+        elif entry.get('done'):
+            self.done.add(entry['job'])
+            tmdb_id = entry.get('tmdb_id')
+            users = self._users.get(tmdb_id, set())
+            users.discard(entry['job'])
+            # Pages of movies no job is working on go to the bounded finished list
+            if not users:
+                self._users.pop(tmdb_id, None)
+                if tmdb_id in self.pages:
+                    self.finished[tmdb_id] = self.pages.pop(tmdb_id)
+                    while len(self.finished) > FINISHED_MOVIES_KEPT:
+                        self.finished.popitem(last=False)
+            if self.keep_results and 'result' in entry:
+                self.results[entry['job']] = entry['result']
+    
+    def _use(self, tmdb_id):
+        """Return the pages of a movie being worked on, taking them back from finished"""
+        if tmdb_id not in self.pages:
+            self.pages[tmdb_id] = self.finished.pop(tmdb_id, {})
+        return self.pages[tmdb_id]
+    
+    def _append(self, entry):
+        with self._lock:
+            self._apply(entry)
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+    
+    def close(self):
+        with self._lock:
+            self._file.close()
+    
+    def movie_for(self, job):
+        """Return (known, movie) for a job; movie is None when its search found nothing"""
+        with self._lock:
+            if job in self.movies:
+                return True, self.movies[job]
+            return False, None
+    
+    def record_movie(self, job, movie):
+        self._append({'job': job, 'movie': movie})
+    
+    def pages_for(self, tmdb_id):
+        """Return the pages of a movie completed so far"""
+        with self._lock:
+            return dict(self.pages.get(tmdb_id) or self.finished.get(tmdb_id) or {})
+    
+    def record_page(self, tmdb_id, page, value):
+        self._append({'tmdb_id': tmdb_id, 'page': page, 'value': value})
+    
+    def missing_pages(self, tmdb_id):
+        """Return the pages of a movie that have not been completed yet"""
+        with self._lock:
+            pages = self.pages.get(tmdb_id) or self.finished.get(tmdb_id) or {}
+            return [page for page in MOVIE_PAGES if page not in pages]
+    
+    def is_done(self, job):
+        with self._lock:
+            return job in self.done
+    
+    def mark_done(self, job, tmdb_id=None, result=None):
+        entry = {'job': job, 'tmdb_id': tmdb_id, 'done': True}
+        if self.keep_results and result is not None:
+            entry['result'] = result
+        self._append(entry)
+
+# Where the local metadata database lives; override with TMDB_METADATA_PATH
+METADATA_PATH = os.environ.get('TMDB_METADATA_PATH') or os.path.join(os.path.expanduser('~'), '.cache', 'tmdb_metadata.db')
+
+# Columns of the full-text index, and the ones a title search looks at
+FTS_COLUMNS = ('title', 'alternative_title', 'overview')
+TITLE_COLUMNS = ('title', 'alternative_title')
+
+# Search card fields that stored details only fill in, so stored movies keep the shape of a card
+CARD_KEYS = ('title', 'alternative_title', 'url', 'release_date', 'overview', 'poster_url', 'media_type', 'adult_content')
+
+class MetadataStore:
+    """Local SQLite database of resolved movies, indexed by tmdb_id
+    
+    Every movie is kept as its merged search card and details, with an FTS5
+    index over title, alternative_title and overview so searches can be
+    answered locally, also when the box is offline. SQLite builds without
+    FTS5 fall back to LIKE matching on the title columns.
+    
+    The card fields (CARD_KEYS) come from search cards: the details page
+    has its own title ("The Naked Gun(2025)") and date formats, so
+    put_details() only fills them in when no card was stored yet, and
+    search() keeps returning records shaped like search cards.
+    """
+    
+    def __init__(self, path=METADATA_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS movies ('
+            'tmdb_id INTEGER PRIMARY KEY, title TEXT, alternative_title TEXT, '
+            'overview TEXT, release_date TEXT, data TEXT, updated REAL)'
+        )
+        try:
+            self._db.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5({', '.join(FTS_COLUMNS)})")
+            self.full_text = True
+        except sqlite3.OperationalError:
+            self.full_text = False
+        self._db.commit()
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+    
+    def get(self, tmdb_id):
+        """Return the stored movie for a tmdb_id, or None"""
+        with self._lock:
+            row = self._db.execute('SELECT data FROM movies WHERE tmdb_id = ?', (int(tmdb_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def updated(self, tmdb_id):
+        """Return when a movie was last written, or None when it is not stored"""
+        with self._lock:
+            row = self._db.execute('SELECT updated FROM movies WHERE tmdb_id = ?', (int(tmdb_id),)).fetchone()
+        return row[0] if row else None
+    
+    def put(self, movie):
+        """Store a search card, merged into what is already known"""
+        self.put_many([movie])
+    
+    def put_details(self, tmdb_id, details):
+        """Store the details of a movie, keeping the card fields already known"""
+        self.put_many([dict(details, tmdb_id=tmdb_id)], details=True)
+    
+    def put_many(self, movies, details=False):
+        """Store several movies in one transaction, skipping ones without a tmdb_id
+        
+        With details=True the movies are details dicts, which never replace
+        the stored card fields.
+        """
+        now = time.time()
+        with self._lock:
+            for movie in movies:
+                tmdb_id = movie.get('tmdb_id')
+                if not tmdb_id or not str(tmdb_id).isdigit():
+                    continue
+                tmdb_id = int(tmdb_id)
+                
+                row = self._db.execute('SELECT data FROM movies WHERE tmdb_id = ?', (tmdb_id,)).fetchone()
+                data = json.loads(row[0]) if row else {}
+                for key, value in movie.items():
+                    if not details or key not in CARD_KEYS or data.get(key) is None:
+                        data[key] = value
+                
+                self._db.execute(
+                    'INSERT OR REPLACE INTO movies VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (tmdb_id, data.get('title'), data.get('alternative_title'), data.get('overview'),
+                     data.get('release_date'), json.dumps(data, ensure_ascii=False), now),
+                )
+                if self.full_text:
+                    self._db.execute('DELETE FROM movies_fts WHERE rowid = ?', (tmdb_id,))
+                    self._db.execute(
+                        f"INSERT INTO movies_fts (rowid, {', '.join(FTS_COLUMNS)}) VALUES (?, ?, ?, ?)",
+                        (tmdb_id,) + tuple(data.get(column) or '' for column in FTS_COLUMNS),
+                    )
+            self._db.commit()
+    
+    def search(self, query, columns=TITLE_COLUMNS, limit=20):
+        """Return stored movies whose columns contain every word of query, best match first"""
+        words = re.findall(r'\w+', query.lower())
+        if not words:
             return []
         
-        # Find all poster images with w220_and_h330_face size
-        poster_images = []
-        poster_elements = posters_section.select('img[src*="w220_and_h330_face"]')
-        
-        for poster_element in poster_elements:
-            if poster_element.has_attr('src'):
-                poster_url = poster_element['src']
-                poster_images.append(poster_url)
-        
-        return poster_images
+        with self._lock:
+            if self.full_text:
+                # The column filter only covers the phrase after it, so every word goes in one group
+                match = '{%s} : (%s)' % (' '.join(columns), ' '.join(f'"{word}"' for word in words))
+                rows = self._db.execute(
+                    'SELECT movies.data FROM movies_fts JOIN movies ON movies.tmdb_id = movies_fts.rowid '
+                    'WHERE movies_fts MATCH ? ORDER BY rank LIMIT ?',
+                    (match, limit),
+                ).fetchall()
+            else:
+                conditions = []
+                parameters = []
+                for word in words:
+                    conditions.append('(' + ' OR '.join(f'LOWER({column}) LIKE ?' for column in columns) + ')')
+                    parameters.extend([f'%{word}%'] * len(columns))
+                rows = self._db.execute(
+                    f"SELECT data FROM movies WHERE {' AND '.join(conditions)} LIMIT ?",
+                    parameters + [limit],
+                ).fetchall()
+        
+        return [json.loads(row[0]) for row in rows]
+    
+    def __iter__(self):
+        """Iterate over every stored movie"""
+        with self._lock:
+            rows = self._db.execute('SELECT data FROM movies ORDER BY tmdb_id').fetchall()
+        for row in rows:
+            yield json.loads(row[0])
+    
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM movies').fetchone()[0]
+
+# Connection setup times of the request running on the current thread
+_connection_timing = threading.local()
+
+def _timed_connection_class(connection_class):
+    """Subclass a urllib3 connection class to time DNS+TCP connect and the TLS handshake"""
+    class TimedConnection(connection_class):
+        def _new_conn(self):
+            start = time.perf_counter()
+            try:
+                return super()._new_conn()
+            finally:
+                _connection_timing.connect = time.perf_counter() - start
         
-    except Exception as e:
-        print(f"Error scraping posters: {e}")
-        return []
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                total = time.perf_counter() - start
+                _connection_timing.tls = max(0.0, total - getattr(_connection_timing, 'connect', 0.0))
+    
+    TimedConnection.__name__ = 'Timed' + connection_class.__name__
+    return TimedConnection
+
+_timed_http_adapter = None
 
-def scrape_movie_trailers(movie_url):
-    """Scrape trailer videos from the movie's videos page"""
-    trailers_url = movie_url + "/videos?active_nav_item=Trailers"
+def _timed_http_adapter_class():
+    """Build TimedHTTPAdapter on first use, when requests gets imported"""
+    global _timed_http_adapter
+    if _timed_http_adapter is not None:
+        return _timed_http_adapter
     
-    try:
-        # Add a small delay to avoid overwhelming the server
-        time.sleep(0.5)
-        
-        # Make the request
-        response = requests.get(trailers_url, headers=headers, verify=False, timeout=10)
-        response.raise_for_status()
-        
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find the section with trailers
-        trailers_section = soup.find('section', class_='panel video')
-        if not trailers_section:
-            return []
-        
-        # Find all trailer elements
-        trailers = []
-        trailer_elements = trailers_section.find_all('div', class_='video card default')
+    from requests.adapters import HTTPAdapter
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    
+    class TimedHTTPAdapter(HTTPAdapter):
+        """HTTPAdapter whose new connections report how long they took to set up"""
+        
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': type('TimedHTTPConnectionPool', (HTTPConnectionPool,),
+                             {'ConnectionCls': _timed_connection_class(HTTPConnectionPool.ConnectionCls)}),
+                'https': type('TimedHTTPSConnectionPool', (HTTPSConnectionPool,),
+                              {'ConnectionCls': _timed_connection_class(HTTPSConnectionPool.ConnectionCls)}),
+            }
+    
+    _timed_http_adapter = TimedHTTPAdapter
+    return TimedHTTPAdapter
+
+def __getattr__(name):
+    # TimedHTTPAdapter stays importable from the module without importing requests up front
+    if name == 'TimedHTTPAdapter':
+        return _timed_http_adapter_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class ScraperMetrics:
+    """Per-request and per-parse instrumentation of a scraper
+    
+    Every HTTP request and every parse produces one event dict, passed to
+    the listeners and kept in a bounded list of recent events. Aggregates
+    per page type are exported with snapshot() as JSON or with
+    to_prometheus() in the Prometheus text format.
+    
+    Request events carry url, url_class, status, bytes, cache (hit, miss,
+    revalidated, off or stream), wait (time spent in the rate limiter), connect
+    (DNS and TCP, only for new connections), tls, ttfb and total times in
+    seconds. Parse events carry url, url_class, backend, bytes and parse.
+    """
+    
+    REQUEST_TIMES = ('wait', 'connect', 'tls', 'ttfb', 'total')
+    
+    # Prometheus metric families: name, type, aggregates and the (extra labels, value) samples of one url_class
+    PROMETHEUS_FAMILIES = (
+        ('tmdb_requests_total', 'counter', 'requests',
+         lambda stats: [(f'status="{status}"', count) for status, count in sorted(stats['status'].items())]),
+        ('tmdb_cache_requests_total', 'counter', 'requests',
+         lambda stats: [(f'cache="{cache}"', count) for cache, count in sorted(stats['cache'].items())]),
+        ('tmdb_request_errors_total', 'counter', 'requests', lambda stats: [('', stats['errors'])]),
+        ('tmdb_response_bytes_total', 'counter', 'requests', lambda stats: [('', stats['bytes'])]),
+        ('tmdb_request_seconds_total', 'counter', 'requests',
+         lambda stats: [(f'phase="{name}"', f'{seconds:.6f}') for name, seconds in stats['seconds'].items()]),
+        ('tmdb_request_max_seconds', 'gauge', 'requests', lambda stats: [('', f'{stats["max_total"]:.6f}')]),
+        ('tmdb_parses_total', 'counter', 'parses', lambda stats: [('', stats['parses'])]),
+        ('tmdb_parse_seconds_total', 'counter', 'parses', lambda stats: [('', f'{stats["seconds"]:.6f}')]),
+    )
+    
+    def __init__(self, listeners=None, max_events=1000):
+        self.listeners = list(listeners or [])
+        self.events = deque(maxlen=max_events)
+        self._requests = {}
+        self._parses = {}
+        self._lock = threading.Lock()
+    
+    def add_listener(self, listener):
+        """Call listener(event) for every event from now on"""
+        self.listeners.append(listener)
+    
+    def record(self, event):
+        """Record one request or parse event"""
+        event.setdefault('time', time.time())
+        with self._lock:
+            self.events.append(event)
+            if event['type'] == 'request':
+                self._add_request(event)
+            else:
+                self._add_parse(event)
         
-        for trailer_element in trailer_elements:
-            trailer = {}
-            
-            # Extract YouTube video ID
-            play_button = trailer_element.find('a', class_='play_trailer')
-            if play_button and play_button.has_attr('data-id'):
-                trailer['youtube_id'] = play_button['data-id']
-                trailer['youtube_url'] = f"https://www.youtube.com/watch?v={play_button['data-id']}"
-            
-            # Extract trailer title
-            title_element = trailer_element.find('h2')
-            if title_element:
-                trailer['title'] = title_element.get_text(strip=True)
-            
-            # Extract trailer duration and date
-            sub_element = trailer_element.find('h3', class_='sub')
-            if sub_element:
-                trailer['details'] = sub_element.get_text(strip=True)
-            
-            # Extract site (usually YouTube)
-            if play_button and play_button.has_attr('data-site'):
-                trailer['site'] = play_button['data-site']
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Error in metrics listener: {e}")
+    
+    def _add_request(self, event):
+        stats = self._requests.setdefault(event['url_class'], {
+            'requests': 0, 'errors': 0, 'bytes': 0, 'status': {}, 'cache': {},
+            'seconds': {name: 0.0 for name in self.REQUEST_TIMES}, 'max_total': 0.0,
+        })
+        stats['requests'] += 1
+        if event.get('error') or (event.get('status') or 0) >= 400:
+            stats['errors'] += 1
+        stats['bytes'] += event.get('bytes') or 0
+        status = str(event.get('status'))
+        stats['status'][status] = stats['status'].get(status, 0) + 1
+        stats['cache'][event['cache']] = stats['cache'].get(event['cache'], 0) + 1
+        for name in self.REQUEST_TIMES:
+            stats['seconds'][name] += event.get(name) or 0.0
+        stats['max_total'] = max(stats['max_total'], event.get('total') or 0.0)
+    
+    def _add_parse(self, event):
+        stats = self._parses.setdefault(event['url_class'], {'parses': 0, 'bytes': 0, 'seconds': 0.0, 'max': 0.0})
+        stats['parses'] += 1
+        stats['bytes'] += event.get('bytes') or 0
+        stats['seconds'] += event['parse']
+        stats['max'] = max(stats['max'], event['parse'])
+    
+    def snapshot(self):
+        """Return the aggregates per page type as a JSON-serializable dict"""
+        with self._lock:
+            return json.loads(json.dumps({'requests': self._requests, 'parses': self._parses}))
+    
+    def to_prometheus(self):
+        """Return the aggregates in the Prometheus text exposition format
+        
+        Each metric family is written as one group, its TYPE line first and
+        then its samples for every url_class.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, kind, aggregates, samples in self.PROMETHEUS_FAMILIES:
+            lines.append(f'# TYPE {name} {kind}')
+            for url_class, stats in sorted(snapshot[aggregates].items()):
+                for labels, value in samples(stats):
+                    labels = f'url_class="{url_class}",{labels}' if labels else f'url_class="{url_class}"'
+                    lines.append(f'{name}{{{labels}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+# Skin size (width, height) each kind of image is pre-resized to, when Pillow is installed
+IMAGE_SIZES = {
+    'poster': (185, 278),
+    'backdrop': (1280, 720),
+    'logo': (400, 150),
+    'profile': (110, 165),
+}
+
+# Movie fields holding image URLs, and the kind of image they hold
+IMAGE_FIELDS = [
+    ('poster_url', 'poster'),
+    ('additional_poster_urls', 'poster'),
+    ('logo_urls', 'logo'),
+    ('backdrop_urls', 'backdrop'),
+]
+
+def collect_image_urls(movie, limit=None):
+    """Return (url, kind) pairs for the images of a movie, at most limit per field"""
+    images = []
+    for field, kind in IMAGE_FIELDS:
+        urls = movie.get(field) or []
+        if isinstance(urls, str):
+            urls = [urls]
+        images.extend((url, kind) for url in urls[:limit])
+    for actor in (movie.get('cast') or [])[:limit]:
+        if actor.get('profile_url'):
+            images.append((actor['profile_url'], 'profile'))
+    return images
+
+class ImageStore:
+    """Content-addressed on-disk image store with concurrent downloads
+    
+    Images are saved under root by the SHA-1 of their bytes, so a poster
+    shared by several titles is stored once, and a URL seen before is never
+    downloaded again. When Pillow is installed every image is also saved
+    pre-resized to the skin size of its kind, so the UI only has to load it.
+    """
+    
+    def __init__(self, root, download, sizes=None, workers=8, limit=5):
+        self.root = root
+        self.download = download
+        self.sizes = dict(IMAGE_SIZES)
+        if sizes:
+            self.sizes.update(sizes)
+        self.limit = limit
+        os.makedirs(root, exist_ok=True)
+        
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS images (url TEXT PRIMARY KEY, digest TEXT, ext TEXT)')
+        self._db.commit()
+        # Downloads currently running, so concurrent requests for one URL share them
+        self._pending = {}
+    
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._db.close()
+    
+    def path_for(self, digest, ext, size=None):
+        """Return the file path of an image, optionally of its resized copy"""
+        directory = os.path.join(self.root, 'original' if size is None else '%dx%d' % size, digest[:2])
+        return os.path.join(directory, digest + ext)
+    
+    def _lookup(self, url):
+        with self._lock:
+            return self._db.execute('SELECT digest, ext FROM images WHERE url = ?', (url,)).fetchone()
+    
+    def _download(self, url, kind):
+        """Download one image (unless its URL is known) and return its paths"""
+        row = self._lookup(url)
+        if row is None:
+            content = self.download(url)
+            digest = hashlib.sha1(content).hexdigest()
+            ext = os.path.splitext(urlsplit(url).path)[1].lower() or '.jpg'
             
-            # Extract channel/publisher info
-            channel_element = trailer_element.find('h4')
-            if channel_element:
-                trailer['channel'] = channel_element.get_text(strip=True)
+            path = self.path_for(digest, ext)
+            if not os.path.exists(path):
+                self._save(path, lambda f: f.write(content))
             
-            if trailer:
-                trailers.append(trailer)
-        
-        return trailers
+            with self._lock:
+                self._db.execute('INSERT OR REPLACE INTO images VALUES (?, ?, ?)', (url, digest, ext))
+                self._db.commit()
+        else:
+            digest, ext = row
         
-    except Exception as e:
-        print(f"Error scraping trailers: {e}")
-        return []
+        paths = {'original': self.path_for(digest, ext)}
+        resized = self._resize(digest, ext, kind)
+        if resized:
+            paths['resized'] = resized
+        return paths
+    
+    def _resize(self, digest, ext, kind):
+        """Save a copy fitted into the skin size of kind, returning its path"""
+        size = self.sizes.get(kind)
+        if not size:
+            return None
+        path = self.path_for(digest, ext, size)
+        if os.path.exists(path):
+            return path
+        
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+        
+        with Image.open(self.path_for(digest, ext)) as image:
+            image_format = image.format
+            image.thumbnail(size)
+            self._save(path, lambda f: image.save(f, format=image_format))
+        return path
+    
+    def _save(self, path, write):
+        """Write a file with write(f) into a temporary file of its own, then move it into place
+        
+        Different URLs can have the same content, so several threads may
+        save the same path at once; each gets a unique temporary name and
+        the last replace wins with a complete file.
+        """
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                write(f)
+            # mkstemp files are private, the images are read by the UI
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(temporary)
+            raise
+    
+    def _submit(self, url, kind):
+        with self._lock:
+            future = self._pending.get(url)
+            if future is None:
+                future = self._executor.submit(self._download, url, kind)
+                self._pending[url] = future
+                future.add_done_callback(lambda _: self._forget(url))
+            return future
+    
+    def _forget(self, url):
+        with self._lock:
+            self._pending.pop(url, None)
+    
+    def fetch_movie_images(self, movie):
+        """Download the images of a movie at the same time, returning {url: paths}"""
+        futures = [(url, self._submit(url, kind)) for url, kind in collect_image_urls(movie, self.limit)]
+        local_images = {}
+        for url, future in futures:
+            try:
+                local_images[url] = future.result()
+            except Exception as e:
+                print(f"Error downloading image {url}: {e}")
+        return local_images
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into a single call
+    
+    The first caller of a key runs the function; callers arriving while it
+    runs wait for it and receive the same result (or exception). Once the
+    call finishes the key is forgotten, so later calls run again.
+    """
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key, function, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = function(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
 
-def scrape_movie_cast(movie_url):
-    """Scrape cast information from the movie's cast page"""
-    cast_url = movie_url + "/cast"
+# Number of keep-alive connections kept open to each host
+POOL_SIZE = 10
+
+def get_accept_encoding():
+    """Return the Accept-Encoding value supported by the installed decoders"""
+    # urllib3 and httpx only decode brotli when one of these packages is installed
+    for module_name in ('brotli', 'brotlicffi'):
+        if _module_available(module_name):
+            return 'gzip, deflate, br'
+    return 'gzip, deflate'
+
+# Starting request rate (per second) of the shared rate limiter, and its bounds
+RATE_LIMIT = 4.0
+MIN_RATE_LIMIT = 0.5
+MAX_RATE_LIMIT = 20.0
+
+# How many times a throttled (HTTP 429) request is retried
+MAX_RETRIES = 3
+
+# Number of movies scraped at the same time in bulk runs
+TITLE_WORKERS = 4
+
+# Processes parsing pages in bulk runs, 0 to parse in the fetching threads
+PARSE_PROCESSES = 0
+
+# Pages waiting for or being parsed per parse process; fetchers wait beyond that
+PARSE_BACKLOG = 2
+
+def parse_page(text, extractor, backend=None, region=None):
+    """Parse a page and run extractor on it, returning (result, parse seconds)
     
+    Lives at module level so it can run in a parse process: only the page
+    text and the extractor go in and only the extracted result comes back.
+    """
+    start = time.perf_counter()
+    result = extractor(parse_html(text, backend, region))
+    return result, time.perf_counter() - start
+
+def _extractor_key(extractor):
+    """Key identifying an extractor for coalescing, equal for partials of one function with the same arguments"""
+    if isinstance(extractor, partial):
+        return (_extractor_key(extractor.func), extractor.args, tuple(sorted(extractor.keywords.items())))
+    # Anything else goes by identity: lambdas from one place share their code but not what they captured
+    return extractor
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) into seconds to wait"""
+    if not value:
+        return None
     try:
-        # Add a small delay to avoid overwhelming the server
-        time.sleep(0.5)
-        
-        # Make the request
-        response = requests.get(cast_url, headers=headers, verify=False, timeout=10)
-        response.raise_for_status()
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """Token bucket shared by every request of one or more scrapers
+    
+    The rate adapts AIMD style: every successful request raises it a little
+    (about `increase` requests per second, per second) up to max_rate, and
+    every HTTP 429 answer halves it and pauses all requests for the
+    Retry-After period.
+    """
+    
+    def __init__(self, rate=RATE_LIMIT, burst=None, min_rate=MIN_RATE_LIMIT, max_rate=MAX_RATE_LIMIT,
+                 increase=0.5, decrease=0.5):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = self.burst
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self.blocked_until - now
+                if delay <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+    
+    def on_success(self):
+        """Additively increase the rate after a request went through"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+    
+    def on_throttle(self, retry_after=None):
+        """Multiplicatively decrease the rate after an HTTP 429 answer"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = 0.0
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+class TmdbScraper:
+    """TMDB scraper client owning one pooled HTTP session
+    
+    All pages are requested through the same session, so connections are
+    kept alive and reused between requests instead of paying a new TCP and
+    TLS handshake for every page. Every request that reaches the network
+    first takes a token from the rate limiter. With http2=True the session
+    is an httpx client multiplexing all requests over one HTTP/2 connection,
+    when httpx and h2 are installed. With metrics, every request and parse
+    is recorded as an event. With coalesce, concurrent requests for the same
+    page share one fetch and one parse, and every caller gets the result.
+    
+    With parse_processes, pages are parsed in a pool of that many processes
+    so bulk runs use every core: the fetching threads only download, hand
+    the text over and get the small extracted result back. At most
+    PARSE_BACKLOG pages per process wait to be parsed; beyond that fetchers
+    block, which keeps memory bounded when parsing falls behind.
+    
+    With stream, section-only pages (images, videos, cast) are downloaded
+    as a stream and reading stops once their section has closed or the
+    requested number of items came in. Streamed pages are never cached.
+    
+    Nothing heavy happens on construction: the session (and with it
+    requests or httpx) and the parser are only loaded on first use, or
+    ahead of it in the background with warm_up(). Each scraper picks its
+    own User-Agent unless one is given.
+    """
+    
+    def __init__(self, pool_size=POOL_SIZE, http2=False, timeout=10, verify=False,
+                 base_url=BASE_URL, max_workers=DETAIL_CONCURRENCY, cache=None,
+                 rate_limiter=None, max_retries=MAX_RETRIES, title_workers=TITLE_WORKERS,
+                 parser=PARSER_BACKEND, store=None, metrics=None, coalesce=True,
+                 parse_processes=PARSE_PROCESSES, stream=False, user_agent=None):
+        self.pool_size = pool_size
+        self.stream = stream
+        self.requests_sent = 0
+        self._sent_lock = threading.Lock()
+        self.parse_pool = None
+        if parse_processes:
+            from concurrent.futures import ProcessPoolExecutor
+            self.parse_pool = ProcessPoolExecutor(max_workers=parse_processes)
+            self.parse_slots = threading.BoundedSemaphore(parse_processes * PARSE_BACKLOG)
+        self.flights = SingleFlight() if coalesce else None
+        self.metrics = metrics
+        self.store = store
+        self.parser = get_parser_backend(parser)
+        self.cache = cache
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.max_retries = max_retries
+        self.title_workers = title_workers
+        self.timeout = timeout
+        self.verify = verify
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.headers = dict(headers)
+        self.headers['User-Agent'] = user_agent or get_random_ua()
+        self.headers['Accept-Encoding'] = get_accept_encoding()
+        self.use_http2 = http2
+        self.http2 = False
+        self._session = None
+        self._session_lock = threading.Lock()
+    
+    @property
+    def session(self):
+        """The pooled session used for every request, created on first use"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session(self.use_http2)
+        return self._session
+    
+    def _create_session(self, http2):
+        """Create the pooled session used for every request"""
+        if not self.verify:
+            # Certificates are not checked, so silence the warning about it
+            import urllib3
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        
+        if http2:
+            try:
+                import httpx
+                session = httpx.Client(
+                    http2=True,
+                    headers=self.headers,
+                    verify=self.verify,
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                    limits=httpx.Limits(max_connections=self.pool_size,
+                                        max_keepalive_connections=self.pool_size),
+                )
+                self.http2 = True
+                return session
+            except ImportError as e:
+                print(f"HTTP/2 transport not available ({e}), using HTTP/1.1")
+        
+        import requests
+        session = requests.Session()
+        session.headers.update(self.headers)
+        adapter = _timed_http_adapter_class()(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    def close(self):
+        """Close the session, all of its pooled connections, the parse pool, the cache and the store"""
+        if self._session is not None:
+            self._session.close()
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
+        if self.cache is not None:
+            self.cache.close()
+        if self.store is not None:
+            self.store.close()
+    
+    def warm_up(self, connect=True):
+        """Load the HTTP stack and the parser in a background thread, returning the thread
+        
+        With connect, a HEAD request to the site also leaves a connection
+        open in the pool, so the first real scrape skips DNS, TCP and TLS.
+        """
+        thread = threading.Thread(target=self._warm_up, args=(connect,), name='tmdb-warm-up', daemon=True)
+        thread.start()
+        return thread
+    
+    def _warm_up(self, connect):
+        try:
+            parse_page('<div class="card"><h2>TMDB</h2></div>', parse_search_results, self.parser, PAGE_REGIONS['search'])
+            session = self.session
+            if connect:
+                if self.http2:
+                    session.head(self.base_url)
+                else:
+                    session.head(self.base_url, verify=self.verify, timeout=self.timeout)
+        except Exception as e:
+            print(f"Error warming up: {e}")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def fetch(self, url):
+        """Download a page through the shared session
+        
+        When a cache is configured, fresh pages are answered from it without
+        touching the network and expired pages are revalidated with a
+        conditional request.
+        """
+        if self.flights is not None:
+            return self.flights.do(('fetch', url), self._fetch, url)
+        return self._fetch(url)
+    
+    def _fetch(self, url):
+        cache_key = redact_url(url)
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        if cached is not None and self.cache.is_fresh(cache_key, cached.fetched):
+            self._record_request(url, cached, 'hit')
+            return cached
+        
+        cache_status = 'off' if self.cache is None else 'miss'
+        request_headers = cached.validators() if cached is not None else {}
+        response = self._send_with_retries(lambda wait: self._request(url, request_headers, cache_status, wait))
+        
+        if cached is not None and response.status_code == 304:
+            self.cache.refresh(cache_key, response)
+            return cached
+        
+        raise_for_status(response)
+        if self.cache is not None:
+            self.cache.store(cache_key, response)
+        return response
+    
+    def _send_with_retries(self, send):
+        """Send a request through the rate limiter, retrying while it is throttled
+        
+        send(wait) sends one attempt, wait being the seconds spent waiting
+        for the rate limiter, and returns its response. Raises the HTTP
+        error when the last attempt is still answered with 429.
+        """
+        for attempt in range(self.max_retries + 1):
+            wait_start = time.perf_counter()
+            self.rate_limiter.acquire()
+            response = send(time.perf_counter() - wait_start)
+            
+            if response.status_code != 429:
+                self.rate_limiter.on_success()
+                return response
+            
+            # Throttled: slow every request down and retry after the pause
+            self.rate_limiter.on_throttle(parse_retry_after(response.headers.get('Retry-After')))
         
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
+        raise_for_status(response)
+        return response
+    
+    def _request(self, url, request_headers, cache_status, wait):
+        """Send one GET request, recording its timings when metrics are enabled"""
+        _connection_timing.__dict__.clear()
+        start = time.perf_counter()
+        try:
+            session = self.session
+            if self.http2:
+                response = session.get(url, headers=request_headers)
+            else:
+                response = session.get(url, headers=request_headers, verify=self.verify, timeout=self.timeout)
+        except Exception as e:
+            _redact_error(e)
+            self._record_request(url, None, cache_status, wait=wait, total=time.perf_counter() - start, error=e)
+            raise
+        
+        if response.status_code == 304:
+            cache_status = 'revalidated'
+        self._record_request(url, response, cache_status, wait=wait, total=time.perf_counter() - start)
+        return response
+    
+    def _record_request(self, url, response, cache_status, wait=0.0, total=0.0, error=None, size=None):
+        if cache_status != 'hit':
+            with self._sent_lock:
+                self.requests_sent += 1
+        if self.metrics is None:
+            return
         
-        # Find the section with cast
-        cast_section = soup.find('section', class_='panel pad')
-        if not cast_section:
-            print("No cast section found")
+        event = {
+            'type': 'request',
+            'url': redact_url(url),
+            'url_class': classify_url(url),
+            'status': response.status_code if response is not None else None,
+            'bytes': size if size is not None else len(response.content) if response is not None else 0,
+            'cache': cache_status,
+            'wait': wait,
+            'connect': getattr(_connection_timing, 'connect', 0.0),
+            'tls': getattr(_connection_timing, 'tls', 0.0),
+            'ttfb': response.elapsed.total_seconds() if hasattr(response, 'elapsed') else 0.0,
+            'total': total,
+        }
+        if error is not None:
+            event['error'] = str(error)
+        self.metrics.record(event)
+    
+    def fetch_section(self, url, region, item_rule=None, limit=None):
+        """Download a page only up to the end of a (tag, class) region, returning its HTML
+        
+        The body is read as a stream and fed to a SectionScanner; the
+        connection is dropped once the region has closed or limit items
+        matching item_rule came in. A fresh cached copy is used when there
+        is one, but the partial page is never stored.
+        """
+        cache_key = redact_url(url)
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        if cached is not None and self.cache.is_fresh(cache_key, cached.fetched):
+            self._record_request(url, cached, 'hit')
+            return cached.text
+        
+        # Every attempt scans into a scanner of its own
+        scanners = []
+        def send(wait):
+            scanners.append(SectionScanner(region, item_rule, limit))
+            return self._stream(url, scanners[-1], wait)
+        
+        self._send_with_retries(send)
+        return scanners[-1].fragment()
+    
+    def _stream(self, url, scanner, wait):
+        """Send a streamed GET request, feeding the body to scanner until it is done, and return the closed response"""
+        _connection_timing.__dict__.clear()
+        start = time.perf_counter()
+        size = 0
+        try:
+            session = self.session
+            if self.http2:
+                request = session.stream('GET', url)
+            else:
+                request = session.get(url, stream=True, verify=self.verify, timeout=self.timeout)
+            with request as response:
+                if response.status_code != 429:
+                    response.raise_for_status()
+                    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+                    if self.http2:
+                        chunks = response.iter_bytes(STREAM_CHUNK_SIZE)
+                    else:
+                        chunks = response.iter_content(STREAM_CHUNK_SIZE)
+                    for chunk in chunks:
+                        size += len(chunk)
+                        scanner.feed(decoder.decode(chunk))
+                        if scanner.done:
+                            break
+        except Exception as e:
+            _redact_error(e)
+            self._record_request(url, None, 'stream', wait=wait, total=time.perf_counter() - start, error=e)
+            raise
+        
+        self._record_request(url, response, 'stream', wait=wait, total=time.perf_counter() - start, size=size)
+        return response
+    
+    def download(self, url):
+        """Download a file (such as an image) through the shared session, bypassing cache and rate limit"""
+        session = self.session
+        if self.http2:
+            response = session.get(url)
+        else:
+            response = session.get(url, verify=self.verify, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+    
+    def fetch_soup(self, url, region=None):
+        """Download a page and parse it, optionally only the given (tag, class) region"""
+        return parse_html(self.fetch(url).text, self.parser, region)
+    
+    def scrape_page(self, url, extractor, region=None, limit=None):
+        """Download a page and run extractor on its parsed (region of the) tree
+        
+        Concurrent calls for the same page and extractor share the result,
+        which callers must therefore not modify. When streaming, limit is
+        the number of items after which the download of a section-only page
+        stops.
+        """
+        if self.flights is not None:
+            key = ('page', url, region, _extractor_key(extractor), limit)
+            return self.flights.do(key, self._scrape_page, url, extractor, region, limit)
+        return self._scrape_page(url, extractor, region, limit)
+    
+    def _scrape_page(self, url, extractor, region, limit=None):
+        kind = classify_url(url)
+        if self.stream and region is not None and kind in STREAM_ITEMS:
+            text = self.fetch_section(url, region, STREAM_ITEMS[kind], limit)
+        else:
+            text = self.fetch(url).text
+        if self.parse_pool is not None:
+            with self.parse_slots:
+                result, elapsed = self.parse_pool.submit(parse_page, text, extractor, self.parser, region).result()
+        else:
+            result, elapsed = parse_page(text, extractor, self.parser, region)
+        if self.metrics is not None:
+            self.metrics.record({
+                'type': 'parse',
+                'url': redact_url(url),
+                'url_class': kind,
+                'backend': self.parser,
+                'bytes': len(text),
+                'parse': elapsed,
+            })
+        return result
+    
+    def scrape_tmdb_movies(self, movie_title, local=True):
+        """Scrape TMDB for movies matching the search title
+        
+        With a metadata store, the title is looked up locally first and the
+        site is only searched on a miss (or always, with local=False); the
+        results are then stored.
+        """
+        if local and self.store is not None:
+            movies = self.store.search(movie_title)
+            if movies:
+                return movies
+        
+        url = self.search_page_url(movie_title)
+        movies = self.scrape_page(url, partial(parse_search_results, base_url=self.base_url), PAGE_REGIONS['search'])
+        if self.store is not None:
+            self.store.put_many(movies)
+        return movies
+    
+    def search_page_url(self, movie_title, page=1):
+        """Return the URL of one page of search results"""
+        # Prepare the search query
+        url = f"{self.base_url}/search?{urlencode({'query': movie_title.lower()})}"
+        if page > 1:
+            url += f"&page={page}"
+        return url
+    
+    def iter_tmdb_movies(self, movie_title, max_results=None, max_pages=None):
+        """Search TMDB page by page, yielding movie cards as they are parsed
+        
+        While the caller works through one page of results the next page is
+        already being downloaded in the background, unless max_pages pages
+        were read or the current page alone reaches max_results. A caller
+        that stops iterating early can leave that one download running; its
+        result is dropped. With a metadata store, local matches are yielded
+        instead of searching the site.
+        """
+        if self.store is not None:
+            movies = self.store.search(movie_title, limit=max_results or 20)
+            if movies:
+                yield from movies
+                return
+        
+        fetch_page = lambda page: self.scrape_page(self.search_page_url(movie_title, page),
+                                                   partial(parse_search_results, base_url=self.base_url),
+                                                   PAGE_REGIONS['search'])
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            page = 1
+            future = executor.submit(fetch_page, page)
+            count = 0
+            page_size = None
+            seen = set()
+            page_movies = []
+            while True:
+                # The page was prefetched, unless the one before was expected to reach max_results
+                cards = future.result() if future is not None else fetch_page(page)
+                future = None
+                
+                # Prefetch the next page while this one is being consumed
+                if page_size is None:
+                    page_size = len(cards)
+                more = cards and len(cards) >= page_size and (max_pages is None or page < max_pages)
+                if more and (max_results is None or count + len(cards) < max_results):
+                    future = executor.submit(fetch_page, page + 1)
+                
+                new_cards = 0
+                for movie in cards:
+                    key = movie.get('tmdb_id') or movie.get('url')
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    new_cards += 1
+                    page_movies.append(movie)
+                    yield movie
+                    count += 1
+                    if max_results is not None and count >= max_results:
+                        return
+                
+                if self.store is not None:
+                    self.store.put_many(page_movies)
+                page_movies = []
+                
+                # A page of nothing but repeats means the results ran out
+                if not new_cards or not more:
+                    return
+                page += 1
+        finally:
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+            # Keep the cards of a page the caller stopped reading halfway
+            if self.store is not None and page_movies:
+                self.store.put_many(page_movies)
+    
+    def scrape_movie_logos(self, movie_url, limit=None):
+        """Scrape logo images from the movie's logos page, keeping at most limit items"""
+        try:
+            return self.scrape_page(movie_url + "/images/logos", partial(parse_movie_logos, limit=limit), PAGE_REGIONS['logos'], limit)
+        except Exception as e:
+            print(f"Error scraping logos: {e}")
             return []
-        
-        # Find all cast members
-        cast = []
-        cast_elements = cast_section.find_all('li', attrs={'data-order': True})
-        
-        for i, cast_element in enumerate(cast_elements[:6]):  # Limit to first 6 cast members
-            actor = {}
+    
+    def scrape_movie_backdrops(self, movie_url, limit=None):
+        """Scrape backdrop images from the movie's backdrops page, keeping at most limit items"""
+        try:
+            return self.scrape_page(movie_url + "/images/backdrops", partial(parse_movie_backdrops, limit=limit), PAGE_REGIONS['backdrops'], limit)
+        except Exception as e:
+            print(f"Error scraping backdrops: {e}")
+            return []
+    
+    def scrape_movie_posters(self, movie_url, limit=None):
+        """Scrape additional poster images from the movie's posters page, keeping at most limit items"""
+        try:
+            return self.scrape_page(movie_url + "/images/posters", partial(parse_movie_posters, limit=limit), PAGE_REGIONS['posters'], limit)
+        except Exception as e:
+            print(f"Error scraping posters: {e}")
+            return []
+    
+    def scrape_movie_trailers(self, movie_url, limit=None):
+        """Scrape trailer videos from the movie's videos page, keeping at most limit items"""
+        try:
+            return self.scrape_page(movie_url + "/videos?active_nav_item=Trailers", partial(parse_movie_trailers, limit=limit), PAGE_REGIONS['videos'], limit)
+        except Exception as e:
+            print(f"Error scraping trailers: {e}")
+            return []
+    
+    def scrape_movie_cast(self, movie_url, limit=CAST_LIMIT):
+        """Scrape cast information from the movie's cast page, keeping at most limit items"""
+        try:
+            return self.scrape_page(movie_url + "/cast", partial(parse_movie_cast, limit=limit), PAGE_REGIONS['cast'], limit)
+        except Exception as e:
+            print(f"Error scraping cast: {e}")
+            return []
+    
+    def scrape_movie_page(self, movie_url, page):
+        """Fetch and parse one page of a movie ('main' or a MOVIE_SUBPAGES key), raising on failure"""
+        if page == 'main':
+            return self.scrape_page(movie_url, parse_movie_page)
+        
+        suffix, parser = MOVIE_SUBPAGE_INDEX[page]
+        url = movie_url + suffix
+        return self.scrape_page(url, parser, PAGE_REGIONS.get(classify_url(url)), MOVIE_PAGE_LIMITS.get(page))
+    
+    def scrape_movie_pages(self, movie_url, pages, max_workers=None, on_page=None):
+        """Fetch several pages of a movie at the same time
+        
+        Returns a (results, errors) pair of dicts keyed by page. on_page is
+        called with (page, value) for each page as soon as it is parsed.
+        Backends that get more pages than asked for in the same request
+        return those too.
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+        
+        results = {}
+        errors = {}
+        if not pages:
+            return results, errors
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            # The main page comes first in pages so it is never starved by the sub-pages
+            futures = {executor.submit(self.scrape_movie_page, movie_url, page): page for page in pages}
+            for future in as_completed(futures):
+                page = futures[future]
+                try:
+                    results[page] = future.result()
+                except Exception as e:
+                    errors[page] = e
+                    continue
+                if on_page is not None:
+                    on_page(page, results[page])
+        
+        return results, errors
+    
+    def scrape_movie_details(self, movie_url, max_workers=None, state=None):
+        """Scrape detailed information from a specific movie page
+        
+        The movie page and all of its sub-pages are fetched at the same time,
+        at most max_workers at once, so the call takes about as long as the
+        slowest page instead of the sum of all of them. With a CrawlState,
+        pages completed before (by an earlier run or another title of the
+        same movie) are reused and every newly parsed page is checkpointed.
+        """
+        done_pages = {}
+        on_page = None
+        if state is not None:
+            tmdb_id = movie_id_from_url(movie_url)
+            done_pages = state.pages_for(tmdb_id)
+            on_page = lambda page, value: state.record_page(tmdb_id, page, value)
+        
+        pages = [page for page in MOVIE_PAGES if page not in done_pages]
+        results, errors = self.scrape_movie_pages(movie_url, pages, max_workers, on_page)
+        results.update(done_pages)
+        
+        if 'main' not in results:
+            print(f"Error scraping movie details: {errors.get('main')}")
+            return None
+        
+        for page, error in errors.items():
+            print(f"Error scraping {page}: {error}")
+        
+        details = assemble_details(results)
+        if self.store is not None:
+            self.store.put_details(movie_id_from_url(movie_url), details)
+        return details
+    
+    def get_movie(self, movie_url, fields=None):
+        """Return a LazyMovie, fetching up front only the pages behind fields"""
+        return LazyMovie(self, movie_url, fields)
+    
+    def iter_movie_details(self, movies, workers=None, state=None):
+        """Scrape the details of many movies at once
+        
+        Yields (index, details) pairs in the order the movies finish, where
+        index is the position of the movie in movies and details is None
+        when the movie has no URL or could not be scraped. Movies can be a
+        lazy iterable of any length. With a CrawlState (keep_results=True),
+        movies finished by an earlier run are answered from the checkpoint.
+        """
+        def scrape(movie):
+            if 'url' not in movie:
+                return None
             
-            # Extract actor name - look for the <a> tag inside the <p> tag
-            info_div = cast_element.find('div', class_='info')
-            if info_div:
-                p_tag = info_div.find('p')
-                if p_tag:
-                    a_tag = p_tag.find('a')
-                    if a_tag:
-                        actor['name'] = a_tag.get_text(strip=True)
+            job = movie.get('tmdb_id') or movie['url']
+            if state is not None and state.is_done(job):
+                return state.results.get(job)
             
-            # Extract character name
-            character_element = cast_element.find('p', class_='character')
-            if character_element:
-                actor['character'] = character_element.get_text(strip=True)
+            details = self.scrape_movie_details(movie['url'], state=state)
+            tmdb_id = movie_id_from_url(movie['url'])
+            if details and state is not None and not state.missing_pages(tmdb_id):
+                state.mark_done(job, tmdb_id, details)
+            return details
+        
+        return imap_unordered(scrape, movies, workers or self.title_workers)
+    
+    def enrich_title(self, title, state=None):
+        """Search a title and return the best match merged with its details
+        
+        With a CrawlState, returns None for titles handled by an earlier run
+        and reuses the search result and pages checkpointed so far.
+        """
+        record = {'query': title}
+        job = normalize_title(title)
+        known, movie = state.movie_for(job) if state is not None else (False, None)
+        if state is not None and (state.is_done(job) or (known and movie is None)):
+            return None
+        
+        if not known:
+            try:
+                movies = self.scrape_tmdb_movies(title)
+            except Exception as e:
+                record['error'] = f"Error searching: {e}"
+                return record
             
-            # Extract profile image URL (w66_and_h66_face size)
-            profile_img = cast_element.find('img', class_='profile')
-            if profile_img and profile_img.has_attr('src'):
-                profile_url = profile_img['src']
-                actor['profile_url'] = profile_url
+            movie = next((movie for movie in movies if 'url' in movie), None)
+            if state is not None:
+                state.record_movie(job, movie)
+        
+        if movie is None:
+            record['error'] = "No movies found"
+            return record
+        
+        details = self.scrape_movie_details(movie['url'], state=state)
+        if not details:
+            record['error'] = "Failed to scrape detailed information"
+        elif state is not None:
+            # Leave the title unfinished so a restart retries the failed pages
+            missing = state.missing_pages(movie_id_from_url(movie['url']))
+            if missing:
+                record['error'] = f"Failed to scrape pages: {', '.join(missing)}"
+        record.update(movie)
+        record.update(details or {})
+        return keep_search_title(record, movie)
+    
+    def enrich_titles(self, titles, workers=None, state=None, images=None):
+        """Enrich many titles at once, yielding one record per unique title as it finishes
+        
+        With an ImageStore, the images of every record are downloaded on the
+        same worker and their local paths added as local_images.
+        """
+        unique_titles = dedupe_titles(titles)
+        
+        def enrich(title):
+            record = self.enrich_title(title, state)
+            if record is not None and images is not None and 'url' in record:
+                record['local_images'] = images.fetch_movie_images(record)
+            return record
+        
+        for _, record in imap_unordered(enrich, unique_titles, workers or self.title_workers):
+            if record is None:
+                continue
+            yield record
             
-            # Only add if we have at least a name
-            if actor.get('name'):
-                cast.append(actor)
+            # Only checkpoint a title once the caller has consumed its record
+            if state is not None and 'error' not in record:
+                state.mark_done(normalize_title(record['query']), movie_id_from_url(record['url']))
+
+def imap_unordered(function, items, workers):
+    """Run function over items on a thread pool, yielding (index, result) as each finishes
+    
+    Only a couple of items per worker are submitted ahead, so items can be a
+    lazy iterable of any length while memory stays bounded.
+    """
+    workers = max(1, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        for index, item in enumerate(items):
+            pending[executor.submit(function, item)] = index
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+def normalize_title(title):
+    """Normalize a title for duplicate detection (case and whitespace)"""
+    return ' '.join(title.split()).casefold()
+
+def dedupe_titles(titles):
+    """Yield the stripped non-empty titles, skipping ones already seen after normalization"""
+    seen = set()
+    for title in titles:
+        title = title.strip()
+        key = normalize_title(title)
+        if key and key not in seen:
+            seen.add(key)
+            yield title
+
+def run_batch(scraper, titles, output, workers=None, state=None, images=None):
+    """Write one JSON object per line to output as each title is enriched, returning the count"""
+    count = 0
+    for record in scraper.enrich_titles(titles, workers, state, images):
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+        count += 1
+    return count
+
+# Lowest similarity (0 to 1) at which a title counts as a match
+MATCH_THRESHOLD = 0.6
+
+def epg_title_variants(title):
+    """Return the normalized forms worth trying for an EPG title, best guess first
+    
+    Besides the title itself, the part after a short leading "Channel:"
+    segment is tried, since a real title can also contain a colon.
+    """
+    variants = [normalize_epg_title(title)]
+    head, separator, rest = title.partition(':')
+    if separator and rest.strip() and len(head.split()) <= 3:
+        variant = normalize_epg_title(rest)
+        if variant[0] and variant[0] != variants[0][0]:
+            variants.append((variant[0], variant[1] or variants[0][1]))
+    return variants
+
+def title_trigrams(text):
+    """Return the set of character trigrams of a folded title, word starts padded"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _release_year(movie):
+    match = re.search(r'\b(19\d\d|20\d\d)\b', movie.get('release_date') or '')
+    return int(match.group(1)) if match else None
+
+def _year_mismatch(movie, year):
+    """Return whether a movie was released more than a year away from year, when both are known"""
+    release_year = _release_year(movie)
+    return bool(year and release_year and abs(release_year - year) > 1)
+
+# Weight of the part of a title before a colon ("The Naked Gun" of "The Naked Gun: From the Files ...")
+TITLE_HEAD_WEIGHT = 0.95
+
+# Card fields a TitleIndex keeps of every movie
+INDEX_FIELDS = ('title', 'alternative_title', 'url', 'release_date', 'tmdb_id')
+
+class TitleIndex:
+    """Trigram index over resolved titles for fuzzy lookups without the network
+    
+    Every title and alternative title is folded with fold_title() and cut
+    into trigrams, and so is the part of a title before a colon, which EPG
+    guides often use alone (weighed down by TITLE_HEAD_WEIGHT). lookup()
+    ranks the entries sharing trigrams with a query by the Dice similarity
+    of the two trigram sets, nudged up when the release year matches the
+    wanted year and down when it is off; movies more than a year off are
+    dropped when another candidate fits the year. Only the small card
+    fields of each movie are kept.
+    """
+    
+    def __init__(self, movies=()):
+        self._entries = []
+        self._postings = {}
+        self._keys = set()
+        self._lock = threading.Lock()
+        for movie in movies:
+            self.add(movie)
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def add(self, movie):
+        """Index the title and alternative title of a movie card"""
+        tmdb_id = str(movie.get('tmdb_id') or movie_id_from_url(movie.get('url') or ''))
+        card = {key: movie[key] for key in INDEX_FIELDS if movie.get(key)}
+        forms = []
+        for name in TITLE_COLUMNS:
+            title = movie.get(name) or ''
+            forms.append((fold_title(title), 1.0))
+            head = fold_title(title.partition(':')[0]) if ':' in title else ''
+            if len(head.split()) > 1:
+                forms.append((head, TITLE_HEAD_WEIGHT))
+        
+        with self._lock:
+            for folded, weight in forms:
+                if not folded or (tmdb_id, folded) in self._keys:
+                    continue
+                self._keys.add((tmdb_id, folded))
+                trigrams = title_trigrams(folded)
+                entry = len(self._entries)
+                self._entries.append((len(trigrams), card, weight))
+                for trigram in trigrams:
+                    self._postings.setdefault(trigram, []).append(entry)
+    
+    def lookup(self, title, year=None, limit=5):
+        """Return up to limit (score, card) pairs for a folded title, best first"""
+        trigrams = title_trigrams(title)
+        shared = {}
+        with self._lock:
+            for trigram in trigrams:
+                for entry in self._postings.get(trigram, ()):
+                    shared[entry] = shared.get(entry, 0) + 1
+            entries = [(count, self._entries[entry]) for entry, count in shared.items()]
+        
+        # Movies far off the year only count when no candidate fits it
+        if year and any(_release_year(card) and not _year_mismatch(card, year) for _, (_, card, _) in entries):
+            entries = [entry for entry in entries if not _year_mismatch(entry[1][1], year)]
+        
+        best = {}
+        for count, (size, card, weight) in entries:
+            score = 2 * count / (len(trigrams) + size) * weight
+            release_year = _release_year(card)
+            if year and release_year:
+                if release_year == year:
+                    score += 0.1
+                elif abs(release_year - year) == 1:
+                    score += 0.05
+                else:
+                    score -= 0.25
+            # A movie indexed under two titles counts with its better one
+            key = str(card.get('tmdb_id') or movie_id_from_url(card.get('url') or ''))
+            if key not in best or score > best[key][0]:
+                best[key] = (score, card)
+        return sorted(best.values(), key=lambda pair: pair[0], reverse=True)[:limit]
+
+class EpgMatcher:
+    """Resolves EPG titles to movies, locally whenever possible
+    
+    Titles are normalized with normalize_epg_title() and looked up in a
+    TitleIndex of everything in the scraper's metadata store. Only when no
+    entry scores at least threshold is the site searched, with the cleaned
+    title, and the results are indexed for next time. Every normalized
+    title is resolved once, so repeats and near-identical spellings of the
+    same event cost nothing.
+    """
+    
+    def __init__(self, scraper, threshold=MATCH_THRESHOLD):
+        self.scraper = scraper
+        self.threshold = threshold
+        self.index = TitleIndex(scraper.store if scraper.store is not None else ())
+        self.local_matches = 0
+        self.searches = 0
+        self._resolved = {}
+        self._lock = threading.Lock()
+    
+    def best_local(self, epg_title):
+        """Return the best (score, card) for an EPG title from the index, or None"""
+        best = None
+        for title, year in epg_title_variants(epg_title):
+            if not title:
+                continue
+            for score, card in self.index.lookup(title, year, limit=1):
+                if best is None or score > best[0]:
+                    best = (score, card)
+        return best
+    
+    def match(self, epg_title):
+        """Return the movie card an EPG title refers to, or None when nothing is close enough
+        
+        A local candidate released more than a year away from the EPG year
+        is not trusted (the index may only know a remake): the site itself
+        is searched for the right one instead, past the metadata store, and
+        a movie that still misses the year is never returned.
+        """
+        variants = epg_title_variants(epg_title)
+        key = variants[0]
+        year = next((year for _, year in variants if year), None)
+        with self._lock:
+            if key in self._resolved:
+                return self._resolved[key]
+        
+        best = self.best_local(epg_title)
+        if best is not None and best[0] >= self.threshold and not _year_mismatch(best[1], year):
+            self.local_matches += 1
+        else:
+            # Search the site with the cleaned titles and index what comes back
+            for title, _ in variants:
+                if not title:
+                    continue
+                self.searches += 1
+                for movie in self.scraper.scrape_tmdb_movies(title, local=False):
+                    self.index.add(movie)
+                best = self.best_local(epg_title)
+                if best is not None and best[0] >= self.threshold and not _year_mismatch(best[1], year):
+                    break
+        
+        if best is not None and best[0] >= self.threshold and not _year_mismatch(best[1], year):
+            movie = best[1]
+        else:
+            movie = None
+        with self._lock:
+            self._resolved[key] = movie
+        return movie
+
+# Requests per hour the prefetch scheduler may send
+PREFETCH_BUDGET = 120
+
+# Seconds after which prefetched details are scraped again
+PREFETCH_STALE_AFTER = 7 * 24 * 3600
+
+# Only events starting within this many seconds are prefetched
+PREFETCH_HORIZON = 24 * 3600
+
+# Events that started longer ago than this many seconds are dropped
+PREFETCH_GRACE = 3600
+
+def parse_event_time(value):
+    """Return an EPG start time (epoch seconds or ISO 8601 text) as epoch seconds"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if value.replace('.', '', 1).isdigit():
+        return float(value)
+    return datetime.fromisoformat(value).timestamp()
+
+def _has_details(movie):
+    return any(key in movie for key in ('tagline', 'runtime', 'genres', 'rating', 'director'))
+
+class PrefetchScheduler:
+    """Background thread resolving the movies of upcoming EPG events ahead of time
+    
+    Events (title and start time) wait in a heap ordered by airing time. The
+    thread takes the soonest one starting within horizon seconds, resolves
+    its title with an EpgMatcher (locally when it can) and scrapes the
+    details of the match into the scraper's metadata store, so the info
+    screen finds everything locally when the event airs. Stored details
+    older than stale_after seconds are scraped again; fresh ones cost
+    nothing.
+    
+    Work only happens while idle() returns True (no recording or zapping,
+    say) and while fewer than budget requests were sent in the last hour.
+    Events that started more than PREFETCH_GRACE seconds ago are dropped.
+    """
+    
+    def __init__(self, scraper, budget=PREFETCH_BUDGET, stale_after=PREFETCH_STALE_AFTER,
+                 horizon=PREFETCH_HORIZON, idle=None, interval=60, matcher=None):
+        if scraper.store is None:
+            raise ValueError("The prefetch scheduler needs a scraper with a metadata store")
+        self.scraper = scraper
+        self.matcher = matcher if matcher is not None else EpgMatcher(scraper)
+        self.budget = budget
+        self.stale_after = stale_after
+        self.horizon = horizon
+        self.idle = idle
+        self.interval = interval
+        self.prefetched = 0
+        self._events = []
+        self._sequence = 0
+        self._spent = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+    
+    def add_event(self, title, start):
+        """Queue an EPG event airing at start (epoch seconds or ISO 8601 text)"""
+        with self._lock:
+            heapq.heappush(self._events, (parse_event_time(start), self._sequence, title))
+            self._sequence += 1
+        self._wakeup.set()
+    
+    def add_events(self, events):
+        """Queue (title, start) pairs or dicts with title and start keys"""
+        for event in events:
+            if isinstance(event, dict):
+                self.add_event(event['title'], event['start'])
             else:
-                print(f"No name found for cast member {i}")
-        
-        return cast
-        
-    except Exception as e:
-        print(f"Error scraping cast: {e}")
-        return []
+                self.add_event(*event)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._events)
+    
+    def spent(self):
+        """Return the number of requests sent in the last hour"""
+        hour_ago = time.time() - 3600
+        with self._lock:
+            while self._spent and self._spent[0][0] < hour_ago:
+                self._spent.popleft()
+            return sum(cost for _, cost in self._spent)
+    
+    def _next_event(self):
+        """Pop the soonest event due for prefetching, dropping ones that already aired"""
+        now = time.time()
+        with self._lock:
+            while self._events and self._events[0][0] < now - PREFETCH_GRACE:
+                heapq.heappop(self._events)
+            if self._events and self._events[0][0] <= now + self.horizon:
+                return heapq.heappop(self._events)
+        return None
+    
+    def run_once(self):
+        """Prefetch the soonest due event if idle and within budget, returning whether one was handled"""
+        if self.idle is not None and not self.idle():
+            return False
+        if self.spent() >= self.budget:
+            return False
+        
+        event = self._next_event()
+        if event is None:
+            return False
+        
+        start, _, title = event
+        sent_before = self.scraper.requests_sent
+        try:
+            self.prefetch(title)
+        except Exception as e:
+            print(f"Error prefetching {title}: {e}")
+        finally:
+            cost = self.scraper.requests_sent - sent_before
+            if cost:
+                with self._lock:
+                    self._spent.append((time.time(), cost))
+        return True
+    
+    def prefetch(self, title):
+        """Resolve an EPG title and store its match with details, returning the stored movie"""
+        movie = self.matcher.match(title)
+        if movie is None or 'url' not in movie:
+            return None
+        
+        tmdb_id = movie.get('tmdb_id') or movie_id_from_url(movie['url'])
+        stored = self.scraper.store.get(tmdb_id) if str(tmdb_id).isdigit() else None
+        updated = self.scraper.store.updated(tmdb_id) if stored else None
+        if stored and _has_details(stored) and time.time() - updated < self.stale_after:
+            return stored
+        
+        details = self.scraper.scrape_movie_details(movie['url'])
+        if details is None:
+            return None
+        self.prefetched += 1
+        return self.scraper.store.get(tmdb_id) or dict(movie, **details)
+    
+    def _run(self):
+        while not self._stopping.is_set():
+            if not self.run_once():
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+    
+    def start(self):
+        """Start prefetching in a daemon thread"""
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='tmdb-prefetch', daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=None):
+        """Stop the thread after the event being prefetched, if any"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
 
-def scrape_movie_details(movie_url):
-    """Scrape detailed information from a specific movie page"""
+# Scraper backend used by main() and batch mode: 'html' (site pages) or 'api' (TMDB JSON API)
+SCRAPER_BACKEND = os.environ.get('TMDB_BACKEND', 'html')
+
+API_URL = "https://api.themoviedb.org/3"
+IMAGE_URL = "https://media.themoviedb.org/t/p/"
+
+def format_api_date(value, long_format=False):
+    """Format an API date (2025-07-30) like the site does (07/30/2025 or July 30, 2025)"""
     try:
-        # Make the request
-        response = requests.get(movie_url, headers=headers, verify=False, timeout=10)
-        response.raise_for_status()
+        year, month, day = (int(part) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    if long_format:
+        return f"{calendar.month_name[month]} {day}, {year}"
+    return f"{month:02d}/{day:02d}/{year}"
+
+def format_api_runtime(minutes):
+    """Format a runtime in minutes like the site does (1h 25m)"""
+    if not minutes:
+        return None
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes}m" if hours else f"{minutes}m"
+
+def image_url(size, path):
+    return IMAGE_URL + size + path if path else None
+
+def parse_api_search_results(data, base_url=BASE_URL):
+    """Convert API search results into the movie dicts of the search page"""
+    movies_data = []
+    for result in data.get('results', []):
+        movie = {'title': result.get('title') or result.get('name') or "Unknown Title"}
         
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extract detailed information
-        details = {}
-        
-        # Title
-        title_element = soup.find('h2', class_='title')
-        if title_element:
-            details['title'] = title_element.get_text(strip=True)
-        
-        # Tagline
-        tagline_element = soup.find('h3', class_='tagline')
-        if tagline_element:
-            details['tagline'] = tagline_element.get_text(strip=True)
-        
-        # Overview
-        overview_element = soup.find('div', class_='overview')
-        if overview_element:
-            details['overview'] = overview_element.find('p').get_text(strip=True) if overview_element.find('p') else overview_element.get_text(strip=True)
-        
-        # Release date
-        release_date_element = soup.find('span', class_='release')
-        if release_date_element:
-            details['release_date'] = release_date_element.get_text(strip=True)
-        
-        # Runtime
-        runtime_element = soup.find('span', class_='runtime')
-        if runtime_element:
-            details['runtime'] = runtime_element.get_text(strip=True)
-        
-        # Genres
-        genres = []
-        genres_elements = soup.find('span', class_='genres')
-        if genres_elements:
-            for genre in genres_elements.find_all('a'):
-                genres.append(genre.get_text(strip=True))
-            details['genres'] = genres
-        
-        # Rating
-        rating_element = soup.find('div', class_='user_score_chart')
-        if rating_element and rating_element.has_attr('data-percent'):
-            details['rating'] = rating_element['data-percent']
-        
-        # Poster image (w220_and_h330_face version)
-        poster_element = soup.find('img', class_='poster')
-        if poster_element and poster_element.has_attr('src'):
-            poster_url = poster_element['src']
-            details['poster_url'] = poster_url
-        
-        # Scrape logos
-        logos = scrape_movie_logos(movie_url)
-        if logos:
-            details['logo_urls'] = logos
-        
-        # Scrape backdrops
-        backdrops = scrape_movie_backdrops(movie_url)
-        if backdrops:
-            details['backdrop_urls'] = backdrops
-        
-        # Scrape additional posters
-        posters = scrape_movie_posters(movie_url)
-        if posters:
-            details['additional_poster_urls'] = posters
-        
-        # Scrape trailers
-        trailers = scrape_movie_trailers(movie_url)
-        if trailers:
-            details['trailers'] = trailers
-        
-        # Scrape cast (first 6 members)
-        cast = scrape_movie_cast(movie_url)
-        if cast:
-            details['cast'] = cast
-        
-        # Director
-        director_elements = soup.select('ol.people li.profile')
-        for director_element in director_elements:
-            job_element = director_element.find('p', class_='job')
-            if job_element and 'director' in job_element.get_text(strip=True).lower():
-                name_element = director_element.find('p', class_='name')
-                if name_element:
-                    details['director'] = name_element.find('a').get_text(strip=True) if name_element.find('a') else name_element.get_text(strip=True)
-                break
+        original_title = result.get('original_title')
+        if original_title and original_title != movie['title']:
+            movie['alternative_title'] = original_title
         
-        return details
+        movie['url'] = f"{base_url}/movie/{result['id']}"
         
-    except Exception as e:
-        print(f"Error scraping movie details: {e}")
-        return None
+        release_date = format_api_date(result.get('release_date'), long_format=True)
+        if release_date:
+            movie['release_date'] = release_date
+        if result.get('overview'):
+            movie['overview'] = result['overview']
+        if result.get('poster_path'):
+            movie['poster_url'] = image_url('w220_and_h330_face', result['poster_path'])
+        
+        movie['media_type'] = 'movie'
+        movie['adult_content'] = bool(result.get('adult'))
+        movie['tmdb_id'] = str(result['id'])
+        movies_data.append(movie)
+    
+    return movies_data
+
+def parse_api_movie(data):
+    """Split an API movie (with images, videos and credits appended) into its pages"""
+    main = {}
+    if data.get('title'):
+        main['title'] = data['title']
+    if data.get('tagline'):
+        main['tagline'] = data['tagline']
+    if data.get('overview'):
+        main['overview'] = data['overview']
+    release_date = format_api_date(data.get('release_date'))
+    if release_date:
+        main['release_date'] = release_date
+    runtime = format_api_runtime(data.get('runtime'))
+    if runtime:
+        main['runtime'] = runtime
+    if data.get('genres'):
+        main['genres'] = [genre['name'] for genre in data['genres']]
+    if data.get('vote_count'):
+        main['rating'] = str(round(data.get('vote_average', 0) * 10))
+    if data.get('poster_path'):
+        main['poster_url'] = image_url('w300_and_h450_bestv2', data['poster_path'])
+    
+    credits = data.get('credits', {})
+    for member in credits.get('crew', []):
+        if member.get('job') == 'Director':
+            main['director'] = member['name']
+            break
+    
+    images = data.get('images', {})
+    pages = {
+        'main': main,
+        'logo_urls': [image_url('w500', image['file_path']) for image in images.get('logos', [])],
+        'backdrop_urls': [image_url('w500_and_h282_face', image['file_path']) for image in images.get('backdrops', [])],
+        'additional_poster_urls': [image_url('w220_and_h330_face', image['file_path']) for image in images.get('posters', [])],
+    }
+    
+    trailers = []
+    for video in data.get('videos', {}).get('results', []):
+        if video.get('type') != 'Trailer':
+            continue
+        trailer = {}
+        if video.get('site') == 'YouTube' and video.get('key'):
+            trailer['youtube_id'] = video['key']
+            trailer['youtube_url'] = f"https://www.youtube.com/watch?v={video['key']}"
+        if video.get('name'):
+            trailer['title'] = video['name']
+        published = format_api_date((video.get('published_at') or '')[:10], long_format=True)
+        trailer['details'] = f"Trailer • {published}" if published else "Trailer"
+        if video.get('site'):
+            trailer['site'] = video['site']
+        trailers.append(trailer)
+    pages['trailers'] = trailers
+    
+    cast = []
+    for member in credits.get('cast', [])[:CAST_LIMIT]:
+        actor = {'name': member['name']}
+        if member.get('character'):
+            actor['character'] = member['character']
+        if member.get('profile_path'):
+            actor['profile_url'] = image_url('w66_and_h66_face', member['profile_path'])
+        cast.append(actor)
+    pages['cast'] = cast
+    
+    return pages
+
+class TmdbApiScraper(TmdbScraper):
+    """Scraper backed by the TMDB JSON API instead of the site's HTML
+    
+    Results have the same shape as the HTML scraper's. All details of a
+    movie come from one request using append_to_response, and every page
+    asked for by scrape_movie_pages, LazyMovie or the sub-scrapers is cut
+    from that document. Needs an API key (v3) or a read access token (v4),
+    from the arguments or the TMDB_API_KEY / TMDB_API_TOKEN variables.
+    """
+    
+    def __init__(self, api_key=None, api_token=None, api_url=API_URL, language='en-US', **options):
+        super().__init__(**options)
+        self.api_key = api_key or os.environ.get('TMDB_API_KEY')
+        self.api_token = api_token or os.environ.get('TMDB_API_TOKEN')
+        if not self.api_key and not self.api_token:
+            raise ValueError("The API backend needs TMDB_API_KEY or TMDB_API_TOKEN")
+        self.api_url = api_url.rstrip('/')
+        self.language = language
+        
+        self.headers['Accept'] = 'application/json'
+        if self.api_token:
+            self.headers['Authorization'] = f"Bearer {self.api_token}"
+    
+    def api_request_url(self, path, **parameters):
+        """Return the URL of an API endpoint with the credentials and language added
+        
+        The API key is masked with redact_url() wherever the scraper records,
+        prints or caches the URL; prefer the read access token, which only
+        travels in the Authorization header.
+        """
+        if self.api_key:
+            parameters['api_key'] = self.api_key
+        parameters.setdefault('language', self.language)
+        return f"{self.api_url}{path}?{urlencode(parameters)}"
+    
+    def fetch_json(self, url):
+        return json.loads(self.fetch(url).text)
+    
+    def search_page_url(self, movie_title, page=1):
+        return self.api_request_url('/search/movie', query=movie_title, page=page)
+    
+    def scrape_tmdb_movies(self, movie_title, local=True):
+        """Search movies through the API"""
+        if local and self.store is not None:
+            movies = self.store.search(movie_title)
+            if movies:
+                return movies
+        
+        movies = parse_api_search_results(self.fetch_json(self.search_page_url(movie_title)), self.base_url)
+        if self.store is not None:
+            self.store.put_many(movies)
+        return movies
+    
+    def iter_tmdb_movies(self, movie_title, max_results=None, max_pages=None):
+        """Search movies through the API page by page"""
+        count = 0
+        page = 1
+        while max_pages is None or page <= max_pages:
+            data = self.fetch_json(self.search_page_url(movie_title, page))
+            for movie in parse_api_search_results(data, self.base_url):
+                yield movie
+                count += 1
+                if max_results is not None and count >= max_results:
+                    return
+            if page >= data.get('total_pages', 1):
+                return
+            page += 1
+    
+    def fetch_movie_pages(self, movie_url):
+        """Fetch everything about a movie in one request and split it into pages"""
+        url = self.api_request_url(
+            f"/movie/{movie_id_from_url(movie_url)}",
+            append_to_response='images,videos,credits',
+            include_image_language=f"{self.language.split('-')[0]},null",
+        )
+        return parse_api_movie(self.fetch_json(url))
+    
+    def scrape_movie_page(self, movie_url, page):
+        return self.fetch_movie_pages(movie_url)[page]
+    
+    def scrape_movie_pages(self, movie_url, pages, max_workers=None, on_page=None):
+        """Return every page of the single movie request, the requested ones included
+        
+        The other pages came with the same document, so callers keeping
+        them (LazyMovie, a CrawlState) never need to ask again.
+        """
+        results = {}
+        errors = {}
+        if not pages:
+            return results, errors
+        
+        try:
+            results = self.fetch_movie_pages(movie_url)
+        except Exception as e:
+            return results, {page: e for page in pages}
+        
+        if on_page is not None:
+            for page, value in results.items():
+                on_page(page, value)
+        return results, errors
+    
+    def _scrape_api_page(self, movie_url, page, name, limit):
+        try:
+            return self.scrape_movie_page(movie_url, page)[:limit]
+        except Exception as e:
+            print(f"Error scraping {name}: {e}")
+            return []
+    
+    def scrape_movie_logos(self, movie_url, limit=None):
+        return self._scrape_api_page(movie_url, 'logo_urls', 'logos', limit)
+    
+    def scrape_movie_backdrops(self, movie_url, limit=None):
+        return self._scrape_api_page(movie_url, 'backdrop_urls', 'backdrops', limit)
+    
+    def scrape_movie_posters(self, movie_url, limit=None):
+        return self._scrape_api_page(movie_url, 'additional_poster_urls', 'posters', limit)
+    
+    def scrape_movie_trailers(self, movie_url, limit=None):
+        return self._scrape_api_page(movie_url, 'trailers', 'trailers', limit)
+    
+    def scrape_movie_cast(self, movie_url, limit=CAST_LIMIT):
+        return self._scrape_api_page(movie_url, 'cast', 'cast', limit)
+
+def create_scraper(backend=SCRAPER_BACKEND, **options):
+    """Create the scraper for a backend: 'html' (site pages) or 'api' (TMDB JSON API)"""
+    if backend == 'api':
+        return TmdbApiScraper(**options)
+    if backend == 'html':
+        return TmdbScraper(**options)
+    raise ValueError(f"Unknown scraper backend: {backend}")
+
+_default_scraper = None
+_default_scraper_lock = threading.Lock()
+
+def get_default_scraper():
+    """Return the shared scraper used by the module-level scrape_* functions, creating it on first use"""
+    global _default_scraper
+    with _default_scraper_lock:
+        if _default_scraper is None:
+            _default_scraper = TmdbScraper()
+        return _default_scraper
+
+def set_default_scraper(scraper):
+    """Make the module-level scrape_* functions use a configured, long-lived scraper"""
+    global _default_scraper
+    with _default_scraper_lock:
+        _default_scraper = scraper
+
+def fetch_soup(url):
+    """Download a page and parse it into a BeautifulSoup tree"""
+    return get_default_scraper().fetch_soup(url)
+
+def scrape_tmdb_movies(movie_title):
+    """Scrape TMDB for movies matching the search title"""
+    return get_default_scraper().scrape_tmdb_movies(movie_title)
+
+def iter_tmdb_movies(movie_title, max_results=None, max_pages=None):
+    """Search TMDB page by page, yielding movie cards as they are parsed"""
+    return get_default_scraper().iter_tmdb_movies(movie_title, max_results, max_pages)
+
+def scrape_movie_logos(movie_url, limit=None):
+    """Scrape logo images from the movie's logos page, keeping at most limit items"""
+    return get_default_scraper().scrape_movie_logos(movie_url, limit)
+
+def scrape_movie_backdrops(movie_url, limit=None):
+    """Scrape backdrop images from the movie's backdrops page, keeping at most limit items"""
+    return get_default_scraper().scrape_movie_backdrops(movie_url, limit)
+
+def scrape_movie_posters(movie_url, limit=None):
+    """Scrape additional poster images from the movie's posters page, keeping at most limit items"""
+    return get_default_scraper().scrape_movie_posters(movie_url, limit)
+
+def scrape_movie_trailers(movie_url, limit=None):
+    """Scrape trailer videos from the movie's videos page, keeping at most limit items"""
+    return get_default_scraper().scrape_movie_trailers(movie_url, limit)
+
+def scrape_movie_cast(movie_url, limit=CAST_LIMIT):
+    """Scrape cast information from the movie's cast page, keeping at most limit items"""
+    return get_default_scraper().scrape_movie_cast(movie_url, limit)
+
+def scrape_movie_details(movie_url, max_workers=None):
+    """Scrape detailed information from a specific movie page"""
+    return get_default_scraper().scrape_movie_details(movie_url, max_workers)
+
+def get_movie(movie_url, fields=None):
+    """Return a LazyMovie whose pages are fetched on first access"""
+    return get_default_scraper().get_movie(movie_url, fields)
 
 def main():
     title = input("Please enter movie name: ")
     
+    scraper = create_scraper(SCRAPER_BACKEND, cache=HttpCache(CACHE_PATH), store=MetadataStore(METADATA_PATH))
     try:
-        movies = scrape_tmdb_movies(title)
+        movies = scraper.scrape_tmdb_movies(title)
         
         if not movies:
             print("No movies found!")
@@ -510,16 +3147,20 @@ def main():
         selection = input("\nEnter the number of the movie you want to scrape details for (or 'all' for all movies): ")
         
         if selection.lower() == 'all':
-            # Scrape details for all movies
-            detailed_movies = []
-            for i, movie in enumerate(movies, 1):
-                print(f"Scraping details for movie {i}/{len(movies)}: {movie.get('title', 'N/A')}")
-                if 'url' in movie:
-                    details = scrape_movie_details(movie['url'])
-                    if details:
-                        # Merge basic and detailed info
-                        merged_info = {**movie, **details}
-                        detailed_movies.append(merged_info)
+            # Scrape details for all movies, several at a time, checkpointing
+            # progress so an interrupted run can pick up where it stopped
+            state_filename = f"tmdb_{title.replace(' ', '_')}_crawl.jsonl"
+            state = CrawlState(state_filename, keep_results=True)
+            merged = {}
+            for i, (index, details) in enumerate(scraper.iter_movie_details(movies, state=state), 1):
+                movie = movies[index]
+                print(f"Scraped details for movie {i}/{len(movies)}: {movie.get('title', 'N/A')}")
+                if details:
+                    # Merge basic and detailed info into one compact record
+                    merged[index] = Movie.from_dict(movie).update(details)
+            
+            # Keep the search result order in the saved file
+            detailed_movies = [keep_search_title(merged[index].to_dict(), movies[index]) for index in sorted(merged)]
             
             # Save all detailed results
             filename = f"tmdb_{title.replace(' ', '_')}_detailed_results.json"
@@ -527,6 +3168,10 @@ def main():
                 json.dump(detailed_movies, f, indent=2, ensure_ascii=False)
             print(f"All detailed results saved to {filename}")
             
+            # The run is complete, the checkpoint is no longer needed
+            state.close()
+            os.remove(state_filename)
+            
         else:
             try:
                 selection_idx = int(selection) - 1
@@ -535,10 +3180,11 @@ def main():
                     print(f"\nScraping details for: {selected_movie.get('title', 'N/A')}")
                     
                     if 'url' in selected_movie:
-                        details = scrape_movie_details(selected_movie['url'])
+                        details = scraper.scrape_movie_details(selected_movie['url'])
                         if details:
                             # Merge basic and detailed info
-                            merged_info = {**selected_movie, **details}
+                            merged_info = keep_search_title(Movie.from_dict(selected_movie).update(details).to_dict(),
+                                                            selected_movie)
                             
                             # Display the detailed information
                             print("\nDetailed Movie Information:")
@@ -593,10 +3239,142 @@ def main():
             except ValueError:
                 print("Please enter a valid number or 'all'.")
             
-    except requests.RequestException as e:
+    except OSError as e:
         print(f"Error making request: {e}")
     except Exception as e:
         print(f"An error occurred: {e}")
+    finally:
+        scraper.close()
+
+def batch_main(argv=None):
+    """Non-interactive entry point enriching titles read from a file or stdin"""
+    parser = argparse.ArgumentParser(description="Enrich movie titles with TMDB metadata as JSON Lines")
+    parser.add_argument('input', help="file with one title per line, or - for stdin")
+    parser.add_argument('-o', '--output', default='-', help="JSON Lines output file, or - for stdout (default)")
+    parser.add_argument('-w', '--workers', type=int, default=TITLE_WORKERS, help="titles scraped at the same time")
+    parser.add_argument('-p', '--parse-processes', type=int, default=PARSE_PROCESSES,
+                        help="processes parsing pages, 0 to parse in the fetching threads")
+    parser.add_argument('--stream', action='store_true',
+                        help="stop downloading image, video and cast pages once their section is read")
+    parser.add_argument('--cache', default=CACHE_PATH, help="page cache file, empty to disable")
+    parser.add_argument('--state', help="checkpoint file; a restarted run skips titles already written")
+    parser.add_argument('--store', default=METADATA_PATH, help="local metadata database, empty to disable")
+    parser.add_argument('--metrics', help="write request and parse metrics here at the end (.prom for Prometheus text, else JSON)")
+    parser.add_argument('--images', help="download the images of every movie into this directory")
+    parser.add_argument('--backend', choices=('html', 'api'), default=SCRAPER_BACKEND,
+                        help="scrape the site's HTML or use the TMDB JSON API")
+    parser.add_argument('--api-key', help="TMDB API key for the api backend (default: TMDB_API_KEY)")
+    args = parser.parse_args(argv)
+    
+    metrics = ScraperMetrics() if args.metrics else None
+    options = {'api_key': args.api_key} if args.backend == 'api' and args.api_key else {}
+    scraper = create_scraper(args.backend,
+                             cache=HttpCache(args.cache) if args.cache else None,
+                             store=MetadataStore(args.store) if args.store else None,
+                             metrics=metrics, parse_processes=args.parse_processes, stream=args.stream, **options)
+    state = CrawlState(args.state) if args.state else None
+    images = ImageStore(args.images, scraper.download) if args.images else None
+    input_file = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    output_file = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    try:
+        # Keep progress and error messages out of the JSON Lines stream
+        with contextlib.redirect_stdout(sys.stderr):
+            count = run_batch(scraper, input_file, output_file, args.workers, state, images)
+        print(f"Enriched {count} titles", file=sys.stderr)
+        
+        if metrics is not None:
+            with open(args.metrics, 'w', encoding='utf-8') as f:
+                if args.metrics.endswith('.prom'):
+                    f.write(metrics.to_prometheus())
+                else:
+                    json.dump(metrics.snapshot(), f, indent=2)
+    finally:
+        if images is not None:
+            images.close()
+        scraper.close()
+        if state is not None:
+            state.close()
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+def prefetch_main(argv=None):
+    """Daemon entry point prefetching the movies of upcoming EPG events into the metadata store"""
+    parser = argparse.ArgumentParser(description="Prefetch TMDB metadata for upcoming EPG events")
+    parser.add_argument('events', help="JSON list or JSON Lines of {\"title\": ..., \"start\": ...} events, or - for stdin")
+    parser.add_argument('--budget', type=int, default=PREFETCH_BUDGET, help="requests per hour")
+    parser.add_argument('--stale-after', type=float, default=PREFETCH_STALE_AFTER / 3600,
+                        help="hours after which stored details are scraped again")
+    parser.add_argument('--horizon', type=float, default=PREFETCH_HORIZON / 3600,
+                        help="only prefetch events starting within this many hours")
+    parser.add_argument('--cache', default=CACHE_PATH, help="page cache file, empty to disable")
+    parser.add_argument('--store', default=METADATA_PATH, help="local metadata database")
+    parser.add_argument('--backend', choices=('html', 'api'), default=SCRAPER_BACKEND,
+                        help="scrape the site's HTML or use the TMDB JSON API")
+    args = parser.parse_args(argv)
+    
+    input_file = sys.stdin if args.events == '-' else open(args.events, encoding='utf-8')
+    with input_file:
+        text = input_file.read().strip()
+    if text.startswith('['):
+        events = json.loads(text)
+    else:
+        events = [json.loads(line) for line in text.splitlines() if line.strip()]
+    
+    scraper = create_scraper(args.backend, cache=HttpCache(args.cache) if args.cache else None,
+                             store=MetadataStore(args.store))
+    scheduler = PrefetchScheduler(scraper, budget=args.budget, stale_after=args.stale_after * 3600,
+                                  horizon=args.horizon * 3600)
+    scheduler.add_events(events)
+    try:
+        # Run in the foreground until every event was handled or dropped
+        scheduler.start()
+        while len(scheduler):
+            time.sleep(1)
+        scheduler.stop()
+        print(f"Prefetched {scheduler.prefetched} movies", file=sys.stderr)
+    except KeyboardInterrupt:
+        scheduler.stop()
+    finally:
+        scraper.close()
+
+def export_main(argv=None):
+    """Export stage compiling scraped movies into a compact index for the box"""
+    parser = argparse.ArgumentParser(description="Compile scraped movies into a compact memory-mapped index")
+    parser.add_argument('inputs', nargs='*', help="JSON result files or JSON Lines batch output (default: the metadata store)")
+    parser.add_argument('-o', '--output', default=INDEX_PATH, help=f"index file to write (default: {INDEX_PATH})")
+    parser.add_argument('--store', default=METADATA_PATH, help="local metadata database read when no inputs are given")
+    args = parser.parse_args(argv)
+    
+    def read_movies():
+        if not args.inputs:
+            yield from MetadataStore(args.store)
+        for path in args.inputs:
+            with open(path, encoding='utf-8') as f:
+                text = f.read().strip()
+            if text.startswith('['):
+                yield from json.loads(text)
+            else:
+                # Batch output, skipping the titles that failed
+                for line in text.splitlines():
+                    record = json.loads(line) if line.strip() else {}
+                    if 'url' in record:
+                        yield record
+    
+    try:
+        count = write_compact_index(read_movies(), args.output)
+    except (OSError, ValueError) as e:
+        print(f"Error exporting index: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Wrote {count} movies to {args.output} ({os.path.getsize(args.output)} bytes)", file=sys.stderr)
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ['prefetch']:
+        prefetch_main(sys.argv[2:])
+    elif sys.argv[1:2] == ['export']:
+        export_main(sys.argv[2:])
+    elif len(sys.argv) > 1:
+        batch_main()
+    else:
+        main()
@@ -0,0 +1,172 @@
+"""Local stand-in for www.themoviedb.org serving recorded pages
+
+Every TMDB page type the scraper requests, and the api.themoviedb.org/3
+search and movie endpoints, are answered from the fixtures directory,
+with optional latency, server errors and HTTP 429 throttling injected so
+the scraper can be measured and exercised without the network.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Fixture file answering each page type
+PAGE_FIXTURES = {
+    'search': 'search.html',
+    'movie': 'movie.html',
+    'logos': 'logos.html',
+    'backdrops': 'backdrops.html',
+    'posters': 'posters.html',
+    'videos': 'videos.html',
+    'cast': 'cast.html',
+    'api_search': 'api_search.json',
+    'api_movie': 'api_movie.json',
+}
+
+def page_type(path):
+    """Return the page type of a request path, or None for unknown pages"""
+    path = path.rstrip('/')
+    if path.startswith('/3/search/'):
+        return 'api_search'
+    if path.startswith('/3/movie/'):
+        return 'api_movie'
+    if path.startswith('/search'):
+        return 'search'
+    for suffix, kind in (('/images/logos', 'logos'), ('/images/backdrops', 'backdrops'),
+                         ('/images/posters', 'posters'), ('/videos', 'videos'), ('/cast', 'cast')):
+        if path.endswith(suffix):
+            return kind
+    if path.startswith('/movie/'):
+        return 'movie'
+    return None
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, Nagle and
+    # delayed ACKs add 40 ms to every response on a kept-alive connection
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def send_empty(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def do_GET(self):
+        server = self.server
+        server.count_request(self.path)
+        
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+        if server.throttle_rate and random.random() < server.throttle_rate:
+            self.send_empty(429, {'Retry-After': str(server.retry_after)})
+            return
+        if server.error_rate and random.random() < server.error_rate:
+            self.send_empty(500)
+            return
+        
+        kind = page_type(urlsplit(self.path).path)
+        body, etag = server.page(kind)
+        if body is None:
+            self.send_empty(404)
+            return
+        if self.headers.get('If-None-Match') == etag:
+            self.send_empty(304, {'ETag': etag})
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', server.content_types['json' if kind.startswith('api_') else 'html'])
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering TMDB page requests from fixtures"""
+    
+    daemon_threads = True
+    content_types = {'html': 'text/html; charset=utf-8', 'json': 'application/json;charset=utf-8'}
+    
+    def __init__(self, address=('127.0.0.1', 0), fixtures_dir=FIXTURES_DIR, latency=0.0, jitter=0.0,
+                 error_rate=0.0, throttle_rate=0.0, retry_after=1, handler=StandInHandler):
+        super().__init__(address, handler)
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.requests = {}
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def page(self, kind):
+        """Return the (body, etag) of a page type, loading the fixture once"""
+        if kind not in PAGE_FIXTURES:
+            return None, None
+        if kind not in self._pages:
+            with open(os.path.join(self.fixtures_dir, PAGE_FIXTURES[kind]), 'rb') as f:
+                body = f.read()
+            self._pages[kind] = (body, '"%s"' % hashlib.sha1(body).hexdigest())
+        return self._pages[kind]
+    
+    def count_request(self, path):
+        kind = page_type(urlsplit(path).path) or 'other'
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+    
+    def handle_error(self, request, client_address):
+        # Streamed downloads hang up as soon as they have read enough
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+    
+    def start(self):
+        """Serve in a background thread and return the base URL"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+    
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded TMDB pages locally")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random extra seconds per response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="share of requests answered with HTTP 429")
+    args = parser.parse_args()
+    
+    server = StandInServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    print(f"Serving TMDB stand-in on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Offline benchmark of Tmdb_scraper against the local stand-in server
+
+Runs every scraping function against recorded pages served by
+stand_in_server and reports throughput, p50/p95/p99 latency and how the
+time splits between waiting for the network and parsing. Results can be
+saved as JSON and compared with an earlier run to spot regressions.
+
+With --cold-start it instead measures, in fresh interpreters, how long
+importing the module, creating a scraper and the first and second
+search take, with and without a background warm_up() before the first
+search, and which heavy dependencies the import alone pulls in.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Tmdb_scraper
+from stand_in_server import StandInServer
+
+MOVIE_PATH = "/movie/1035259-the-naked-gun"
+
+class TimedScraper(Tmdb_scraper.TmdbScraper):
+    """Scraper splitting the time of each call into network and parse time"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset_timings()
+    
+    def reset_timings(self):
+        with self._lock:
+            self.network_time = 0.0
+            self.parse_time = 0.0
+    
+    def fetch(self, url):
+        start = time.perf_counter()
+        try:
+            return super().fetch(url)
+        finally:
+            self._local.network = getattr(self._local, 'network', 0.0) + time.perf_counter() - start
+    
+    def measure(self, function, *args):
+        """Run function, adding its network time and the rest (parsing) to the totals"""
+        self._local.network = 0.0
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            total = time.perf_counter() - start
+            with self._lock:
+                self.network_time += self._local.network
+                self.parse_time += total - self._local.network
+    
+    def scrape_movie_page(self, movie_url, page):
+        # Pages of scrape_movie_details are fetched on worker threads, time them there
+        return self.measure(super().scrape_movie_page, movie_url, page)
+
+def percentile(values, share):
+    """Nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(share * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def benchmark_functions(scraper, base_url):
+    """Return (name, callable, timed_per_page) for every function to benchmark"""
+    movie_url = base_url + MOVIE_PATH
+    return [
+        ('scrape_tmdb_movies', lambda: scraper.scrape_tmdb_movies("the naked gun"), False),
+        ('scrape_movie_details', lambda: scraper.scrape_movie_details(movie_url), True),
+        ('scrape_movie_logos', lambda: scraper.scrape_movie_logos(movie_url), False),
+        ('scrape_movie_backdrops', lambda: scraper.scrape_movie_backdrops(movie_url), False),
+        ('scrape_movie_posters', lambda: scraper.scrape_movie_posters(movie_url), False),
+        ('scrape_movie_trailers', lambda: scraper.scrape_movie_trailers(movie_url), False),
+        ('scrape_movie_cast', lambda: scraper.scrape_movie_cast(movie_url), False),
+    ]
+
+def run_function(scraper, function, timed_per_page, iterations, concurrency):
+    """Call function iterations times on concurrency threads and collect timings"""
+    scraper.reset_timings()
+    
+    def call(_):
+        start = time.perf_counter()
+        if timed_per_page:
+            function()
+        else:
+            scraper.measure(function)
+        return time.perf_counter() - start
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(call, range(iterations)))
+    elapsed = time.perf_counter() - start
+    
+    return {
+        'calls': iterations,
+        'throughput': iterations / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'network_ms': scraper.network_time / iterations * 1000,
+        'parse_ms': scraper.parse_time / iterations * 1000,
+    }
+
+def print_report(results, baseline=None):
+    print(f"{'function':<24} {'calls':>6} {'calls/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'net ms':>9} {'parse ms':>9}" + (f" {'p50 vs base':>12}" if baseline else ""))
+    for name, result in results.items():
+        line = (f"{name:<24} {result['calls']:>6} {result['throughput']:>9.1f} {result['p50_ms']:>9.1f} "
+                f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['network_ms']:>9.1f} "
+                f"{result['parse_ms']:>9.1f}")
+        if baseline and name in baseline:
+            line += f" {result['p50_ms'] / baseline[name]['p50_ms']:>11.2f}x"
+        print(line)
+
+# Run in a fresh interpreter for every cold start measurement
+COLD_START_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import Tmdb_scraper
+imported = time.perf_counter()
+heavy = [name for name in ('requests', 'urllib3', 'bs4', 'lxml', 'multiprocessing') if name in sys.modules]
+scraper = Tmdb_scraper.TmdbScraper(base_url={base_url!r}, parser={parser!r},
+                                   rate_limiter=Tmdb_scraper.RateLimiter(rate=1e6, burst=1e6, max_rate=1e6))
+created = time.perf_counter()
+if {warm_up!r}:
+    scraper.warm_up().join()
+warmed = time.perf_counter()
+scraper.scrape_tmdb_movies('naked gun')
+first = time.perf_counter()
+scraper.scrape_tmdb_movies('naked gun')
+second = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - start) * 1000, 'create_ms': (created - imported) * 1000,
+                  'warm_up_ms': (warmed - created) * 1000, 'first_ms': (first - warmed) * 1000,
+                  'second_ms': (second - first) * 1000, 'heavy_imports': heavy}}))
+"""
+
+def run_cold_start(base_url, parser, runs):
+    """Measure import, creation and first/second search in fresh interpreters, returning medians per mode"""
+    results = {}
+    for mode, warm_up in (('cold', False), ('warm_up', True)):
+        samples = []
+        for _ in range(runs):
+            probe = COLD_START_PROBE.format(root=ROOT, base_url=base_url, parser=parser, warm_up=warm_up)
+            output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+        
+        results[mode] = {key: statistics.median(sample[key] for sample in samples)
+                         for key in ('import_ms', 'create_ms', 'warm_up_ms', 'first_ms', 'second_ms')}
+        results[mode]['heavy_imports'] = samples[0]['heavy_imports']
+    return results
+
+def print_cold_start_report(results):
+    print(f"{'mode':<10} {'import ms':>10} {'create ms':>10} {'warm-up ms':>11} {'1st search':>11} {'2nd search':>11}  loaded by import")
+    for mode, result in results.items():
+        print(f"{mode:<10} {result['import_ms']:>10.1f} {result['create_ms']:>10.1f} {result['warm_up_ms']:>11.1f} "
+              f"{result['first_ms']:>11.1f} {result['second_ms']:>11.1f}  {', '.join(result['heavy_imports']) or '-'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Tmdb_scraper offline against recorded pages")
+    parser.add_argument('-n', '--iterations', type=int, default=50, help="calls per function")
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help="calls running at the same time")
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added by the stand-in server")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random extra seconds per response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of HTTP 500 answers")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="share of HTTP 429 answers")
+    parser.add_argument('--parser', default=None, help="parser backend (lxml, selectolax, html.parser)")
+    parser.add_argument('--parse-processes', type=int, default=0, help="processes parsing pages, 0 to parse in threads")
+    parser.add_argument('--only', nargs='*', help="benchmark only these functions")
+    parser.add_argument('--cold-start', action='store_true',
+                        help="measure import and first-call time in fresh interpreters (-n runs each)")
+    parser.add_argument('--json', help="save the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare p50 latency with")
+    args = parser.parse_args()
+    
+    server = StandInServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           throttle_rate=args.throttle_rate, retry_after=0)
+    base_url = server.start()
+    
+    if args.cold_start:
+        try:
+            results = run_cold_start(base_url, args.parser, args.iterations)
+        finally:
+            server.stop()
+        print(f"Cold start, median of {args.iterations} fresh interpreters, latency {args.latency * 1000:.0f} ms\n")
+        print_cold_start_report(results)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'parser': args.parser, 'latency': args.latency, 'cold_start': results}, f, indent=2)
+            print(f"\nResults saved to {args.json}")
+        return
+    
+    # No cache, no practical rate limit and no coalescing of the concurrent
+    # calls to the same URL: measure every call, not the politeness
+    limiter = Tmdb_scraper.RateLimiter(rate=1e6, burst=1e6, max_rate=1e6)
+    scraper = TimedScraper(base_url=base_url, rate_limiter=limiter, parser=args.parser, coalesce=False,
+                           parse_processes=args.parse_processes,
+                           pool_size=max(Tmdb_scraper.POOL_SIZE, args.concurrency * Tmdb_scraper.DETAIL_CONCURRENCY))
+    print(f"Parser backend: {scraper.parser}, latency {args.latency * 1000:.0f} ms, "
+          f"{args.iterations} calls per function on {args.concurrency} threads\n")
+    
+    results = {}
+    try:
+        for name, function, timed_per_page in benchmark_functions(scraper, base_url):
+            if args.only and name not in args.only:
+                continue
+            results[name] = run_function(scraper, function, timed_per_page, args.iterations, args.concurrency)
+    finally:
+        scraper.close()
+        server.stop()
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_report(results, baseline)
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'parser': scraper.parser, 'latency': args.latency, 'concurrency': args.concurrency,
+                       'results': results}, f, indent=2)
+        print(f"\nResults saved to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import hashlib
+import mmap
+import os
+import re
+import struct
+import unicodedata
+
+# Words put before an EPG title by guides, followed by a separator (or a space, for the Arabic ones)
+EPG_PREFIXES = re.compile(
+    r'^\s*(?:(?:film|movie|cinema|kino|spielfilm|premiere|filme?s?|new)\s*[:|\-–]\s*|(?:فيلم|فلم|سهرة)\s*[:|\-–]?\s*)',
+    re.IGNORECASE,
+)
+
+# A year in brackets, or after a comma or dash at the end of an EPG title
+EPG_YEAR = re.compile(r'[(\[]\s*((?:19|20)\d\d)\s*[)\]]|[,\-–]\s*((?:19|20)\d\d)\s*$')
+
+# Quality and language tags EPG guides add to the end of titles; real words
+# ("Live and Let Die", "Step Up 3D") are left out, bracketed notes go anyway
+EPG_TAGS = frozenset(['hd', 'fhd', 'uhd', 'sd', '4k', '8k', 'hdr', '720p', '1080p', '2160p',
+                      'dolby', 'atmos', 'omu', 'ov', 'vo', 'vost'])
+
+# Arabic letter variants folded together for matching
+ARABIC_FOLDS = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ى': 'ي', 'ة': 'ه', 'ؤ': 'و', 'ئ': 'ي', 'ـ': None})
+
+def fold_title(title):
+    """Fold a title for matching: no diacritics, Arabic letter variants unified, lower case, words only"""
+    text = unicodedata.normalize('NFKD', title)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = text.translate(ARABIC_FOLDS).casefold()
+    return ' '.join(re.findall(r'\w+', text))
+
+def normalize_epg_title(title):
+    """Normalize an EPG title for matching, returning (title, year)
+    
+    Strips guide prefixes, the year, bracketed notes and trailing quality
+    tags, then folds the rest with fold_title():
+    "Film: The Naked Gun (2025) HD" becomes ("the naked gun", 2025).
+    """
+    text = unicodedata.normalize('NFKC', title)
+    year = None
+    match = EPG_YEAR.search(text)
+    if match:
+        year = int(match.group(1) or match.group(2))
+        text = text[:match.start()] + ' ' + text[match.end():]
+    
+    text = EPG_PREFIXES.sub('', text)
+    text = re.sub(r'\([^)]*\)|\[[^\]]*\]', ' ', text)
+    words = fold_title(text).split()
+    while len(words) > 1 and words[-1] in EPG_TAGS:
+        words.pop()
+    return ' '.join(words), year
+
+# Where the export stage writes the compact index by default
+INDEX_PATH = 'tmdb_movies.idx'
+
+# Compact index header: magic, version, fields per record, movies, title hashes, string blob size
+INDEX_HEADER = struct.Struct('<8sHHIII')
+INDEX_MAGIC = b'TMDBIDX\x00'
+INDEX_VERSION = 2
+
+# Fields of every compact index record, in row order; lists are reduced to one string
+INDEX_RECORD_FIELDS = ('tmdb_id', 'title', 'alternative_title', 'release_date', 'runtime', 'rating', 'genres',
+                       'director', 'tagline', 'overview', 'url', 'poster_url', 'backdrop_url', 'logo_url',
+                       'search_title')
+
+# Record fields whose titles the compact index can find a movie by
+INDEX_TITLE_KEYS = ('title', 'alternative_title', 'search_title')
+
+# Rows of the tmdb_id table (id) and the title table (hash, record)
+INDEX_ID = struct.Struct('<I')
+INDEX_TITLE = struct.Struct('<QI')
+
+def index_title(title):
+    """Return the form a compact index finds a title by: folded, without the year or tags
+    
+    Detail pages give titles like "The Naked Gun(2025)", search cards "The
+    Naked Gun"; both become "the naked gun".
+    """
+    return normalize_epg_title(title)[0]
+
+def title_hash(title):
+    """Return the 64-bit hash of a title as stored in a compact index, see index_title()"""
+    digest = hashlib.blake2b(index_title(title).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+def _movie_id(movie_url):
+    """Return the TMDB ID of a movie URL, or an empty string"""
+    match = re.search(r'/movie/(\d+)', movie_url)
+    return match.group(1) if match else ''
+
+def _index_values(movie):
+    """Return the compact index strings of a movie dict, in INDEX_RECORD_FIELDS order"""
+    values = dict(movie)
+    values['genres'] = ', '.join(movie.get('genres') or ())
+    values['backdrop_url'] = next(iter(movie.get('backdrop_urls') or ()), None)
+    values['logo_url'] = next(iter(movie.get('logo_urls') or ()), None)
+    return [str(values.get(name) or '').replace('\x00', '') for name in INDEX_RECORD_FIELDS]
+
+def write_compact_index(movies, path):
+    """Compile movies into a compact index file for CompactIndex, returning the movie count
+    
+    The file holds a header, the sorted tmdb_ids, the sorted title hashes
+    (of INDEX_TITLE_KEYS, see title_hash()) with their record
+    numbers, one row of string offsets per movie and a blob of the
+    NUL-terminated strings, each stored once. Offset 0 is the empty string.
+    Movies without a numeric tmdb_id are skipped and a later duplicate
+    replaces an earlier one. The file is replaced atomically.
+    """
+    # Key the movies by tmdb_id, which also orders the records
+    by_id = {}
+    for movie in movies:
+        if hasattr(movie, 'to_dict'):
+            movie = movie.to_dict()
+        tmdb_id = str(movie.get('tmdb_id') or _movie_id(movie.get('url') or ''))
+        if tmdb_id.isdigit():
+            by_id[int(tmdb_id)] = dict(movie, tmdb_id=tmdb_id)
+    ids = sorted(by_id)
+    
+    # Build the string blob and the offset rows
+    blob = bytearray(b'\x00')
+    offsets = {'': 0}
+    rows = []
+    titles = []
+    for record, tmdb_id in enumerate(ids):
+        movie = by_id[tmdb_id]
+        row = []
+        for value in _index_values(movie):
+            if value not in offsets:
+                offsets[value] = len(blob)
+                blob += value.encode('utf-8') + b'\x00'
+            row.append(offsets[value])
+        rows.append(row)
+        hashes = {title_hash(movie[name]) for name in INDEX_TITLE_KEYS if movie.get(name)}
+        titles.extend((value, record) for value in hashes)
+    titles.sort()
+    
+    temporary = path + '.part'
+    with open(temporary, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(INDEX_RECORD_FIELDS), len(ids), len(titles), len(blob)))
+        f.write(struct.pack(f'<{len(ids)}I', *ids))
+        for value, record in titles:
+            f.write(INDEX_TITLE.pack(value, record))
+        row_format = struct.Struct(f'<{len(INDEX_RECORD_FIELDS)}I')
+        for row in rows:
+            f.write(row_format.pack(*row))
+        f.write(blob)
+    os.replace(temporary, path)
+    return len(ids)
+
+class CompactIndex:
+    """Read-only lookups in a compact index file written by write_compact_index()
+    
+    The file is memory-mapped and nothing is deserialized up front: get()
+    and find() binary-search the sorted tables in place and decode only the
+    strings of the records they return, so opening the index costs the same
+    for ten movies as for a million and the pages actually touched are all
+    that ends up in memory. find() compares titles without case, accents,
+    the year or EPG prefixes and tags, so it takes EPG titles as they are.
+    This module only needs the standard library, so a plugin can read the
+    index without importing the scraper.
+    """
+    
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, field_count, self._count, self._title_count, blob_size = INDEX_HEADER.unpack_from(self._map)
+        except struct.error:
+            magic = None
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {INDEX_VERSION} compact index")
+        
+        # Section offsets follow from the header
+        self._fields = struct.Struct(f'<{field_count}I')
+        self._names = INDEX_RECORD_FIELDS[:field_count]
+        self._ids = INDEX_HEADER.size
+        self._titles = self._ids + INDEX_ID.size * self._count
+        self._records = self._titles + INDEX_TITLE.size * self._title_count
+        self._strings = self._records + self._fields.size * self._count
+        if self._strings + blob_size > len(self._map):
+            self._map.close()
+            raise ValueError(f"{path} is truncated")
+    
+    def __len__(self):
+        return self._count
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        self._map.close()
+    
+    def _lower_bound(self, start, count, row, value):
+        """Return the first position in a sorted table whose leading column is not below value"""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if row.unpack_from(self._map, start + middle * row.size)[0] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    def _string(self, offset):
+        start = self._strings + offset
+        return self._map[start:self._map.find(b'\x00', start)].decode('utf-8')
+    
+    def record(self, position):
+        """Return the movie dict stored at a record position, without empty fields"""
+        offsets = self._fields.unpack_from(self._map, self._records + position * self._fields.size)
+        return {name: self._string(offset) for name, offset in zip(self._names, offsets) if offset}
+    
+    def get(self, tmdb_id):
+        """Return the movie with a tmdb_id, or None"""
+        tmdb_id = int(tmdb_id)
+        position = self._lower_bound(self._ids, self._count, INDEX_ID, tmdb_id)
+        if position < self._count and INDEX_ID.unpack_from(self._map, self._ids + position * INDEX_ID.size)[0] == tmdb_id:
+            return self.record(position)
+        return None
+    
+    def find(self, title):
+        """Return the movies with a title, alternative title or search title equal to title after index_title()"""
+        wanted = index_title(title)
+        value = title_hash(title)
+        movies = []
+        position = self._lower_bound(self._titles, self._title_count, INDEX_TITLE, value)
+        while position < self._title_count:
+            found, record = INDEX_TITLE.unpack_from(self._map, self._titles + position * INDEX_TITLE.size)
+            if found != value:
+                break
+            # Rule out hash collisions
+            movie = self.record(record)
+            if any(index_title(movie.get(name, '')) == wanted for name in INDEX_TITLE_KEYS):
+                movies.append(movie)
+            position += 1
+        return movies
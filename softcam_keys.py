@@ -0,0 +1,317 @@
+import argparse
+import difflib
+import json
+import os
+import re
+import shutil
+import sys
+from collections import namedtuple
+
+# SoftCam.Key record: "V 021110 08 35F6...D321 ;comment", disabled with a leading '#'
+KEY_LINE = re.compile(
+    r'^(?P<disabled>#)?(?P<system>[A-Za-z])\s+(?P<ident>[0-9A-Fa-f]+)\s+(?P<keynr>\S+)\s+'
+    r'(?P<key>[0-9A-Fa-f]+)\s*(?:;(?P<comment>.*))?$'
+)
+
+# constant.cw record: "CAID:PROVIDER:SID:PMT:PID:: XX XX ... XX", disabled with a leading '#'
+CW_LINE = re.compile(
+    r'^(?P<disabled>#)?(?P<caid>[0-9A-Fa-f]{4}):(?P<provider>[0-9A-Fa-f]+):(?P<sid>[0-9A-Fa-f]+):'
+    r'(?P<pmt>[0-9A-Fa-f]+):(?P<pid>[0-9A-Fa-f]+)::\s*(?P<cw>[0-9A-Fa-f]{2}(?:\s*[0-9A-Fa-f]{2})*)'
+    r'\s*(?:;(?P<comment>.*))?$'
+)
+
+# Version of the JSON patch files written by patch_to_json()
+PATCH_VERSION = 1
+
+KeyEntry = namedtuple('KeyEntry', ['system', 'ident', 'keynr', 'key', 'comment', 'enabled', 'line'])
+CwEntry = namedtuple('CwEntry', ['caid', 'provider', 'sid', 'pmt', 'pid', 'cw', 'channel', 'enabled', 'line'])
+
+# One change of a patch: the bytes old at byte offset (first line number line) become new
+Hunk = namedtuple('Hunk', ['line', 'offset', 'old', 'new'])
+
+def _hex(value, width=4):
+    """Normalize a hex field given as a string or an int to upper case, zero-padded to width"""
+    if isinstance(value, int):
+        return f"{value:0{width}X}"
+    return value.upper().zfill(width)
+
+def _decode(raw):
+    return raw.decode('utf-8', 'surrogateescape').rstrip('\r\n')
+
+def _ending(raw):
+    """Return the line ending of a raw line"""
+    return raw[len(raw.rstrip(b'\r\n')):]
+
+def format_cw(cw):
+    """Format a control word given as hex, with or without spaces, as space-separated byte pairs"""
+    digits = re.sub(r'\s', '', cw).upper()
+    if not re.fullmatch(r'(?:[0-9A-F]{2})+', digits):
+        raise ValueError(f"Invalid control word: {cw!r}")
+    return ' '.join(digits[i:i + 2] for i in range(0, len(digits), 2))
+
+class KeyFile:
+    """SoftCam.Key and constant.cw records, indexed by key and by channel
+    
+    parse_lines() reads the raw lines once, keeping every line with its
+    byte offset and recognizing both formats on the fly, so the two files
+    (or one holding both kinds of records) need a single pass. keys maps
+    (system, ident, keynr) and channels maps (CAID, SID) to the entries
+    with that key in file order, since both files repeat entries; a leading
+    '#' keeps an entry but marks it disabled. Hex fields are upper-cased.
+    
+    Nothing is ever rewritten from the index: set_key() and set_cw() return
+    a Hunk touching only the lines concerned, diff() compares two versions
+    line by line, and patch_file() applies hunks to the file on disk.
+    """
+    
+    def __init__(self, lines=(), path=None):
+        self.path = path
+        self.lines = []
+        self.offsets = [0]
+        self.entries = []
+        self.keys = {}
+        self.channels = {}
+        self.parse_lines(lines)
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f, path)
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    @property
+    def size(self):
+        return self.offsets[-1]
+    
+    def parse_lines(self, lines):
+        """Parse raw lines (bytes with their endings) and append them to the file"""
+        channel = None
+        for raw in lines:
+            number = len(self.lines)
+            self.lines.append(raw)
+            self.offsets.append(self.offsets[-1] + len(raw))
+            text = _decode(raw)
+            stripped = text.strip()
+            
+            # Key records
+            match = KEY_LINE.match(stripped)
+            if match:
+                entry = KeyEntry(match['system'].upper(), match['ident'].upper(), match['keynr'].upper(),
+                                 match['key'].upper(), (match['comment'] or '').strip(), not match['disabled'], number)
+                self.entries.append(entry)
+                self.keys.setdefault((entry.system, entry.ident, entry.keynr), []).append(entry)
+                continue
+            
+            # Control word records, named by the channel line before them
+            match = CW_LINE.match(stripped)
+            if match:
+                entry = CwEntry(_hex(match['caid']), _hex(match['provider'], 6), _hex(match['sid']),
+                                _hex(match['pmt']), _hex(match['pid']), format_cw(match['cw']),
+                                channel, not match['disabled'], number)
+                self.entries.append(entry)
+                self.channels.setdefault((entry.caid, entry.sid), []).append(entry)
+                channel = None
+                continue
+            
+            # Anything else that is not a comment may name the next channel
+            channel = stripped if stripped and stripped[0] not in ';#' else None
+    
+    def key(self, system, ident, keynr):
+        """Return the first enabled key for (system, ident, keynr), or None"""
+        entries = self.keys.get((system.upper(), ident.upper(), keynr.upper()), ())
+        return next((entry.key for entry in entries if entry.enabled), None)
+    
+    def cw(self, caid, sid):
+        """Return the first enabled control word for (CAID, SID), or None"""
+        entries = self.channels.get((_hex(caid), _hex(sid)), ())
+        return next((entry.cw for entry in entries if entry.enabled), None)
+    
+    def line_ending(self):
+        return _ending(self.lines[0]) if self.lines and _ending(self.lines[0]) else b'\n'
+    
+    def _replace(self, number, text):
+        raw = self.lines[number]
+        return Hunk(number, self.offsets[number], raw, text.encode('utf-8', 'surrogateescape') + _ending(raw))
+    
+    def _insert(self, number, texts):
+        """Return a hunk inserting lines before line number, which may be the end of the file"""
+        ending = self.line_ending()
+        new = b''.join(text.encode('utf-8') + ending for text in texts)
+        # Terminate a last line that has no line ending before appending
+        if number == len(self.lines) and number and not _ending(self.lines[-1]):
+            number -= 1
+            return Hunk(number, self.offsets[number], self.lines[number], self.lines[number] + ending + new)
+        return Hunk(number, self.offsets[number], b'', new)
+    
+    def _group_end(self, entries):
+        """Return the line number after the last of entries, or the end of the file"""
+        return entries[-1].line + 1 if entries else len(self.lines)
+    
+    def set_key(self, system, ident, keynr, key, comment=None):
+        """Return the hunk setting a key, or None when it already has that value
+        
+        An existing enabled entry has only its key replaced, so a key of the
+        same length is overwritten in place. A new key goes after the last
+        entry of its system and ident (or system), or at the end.
+        """
+        system, ident, keynr, key = system.upper(), ident.upper(), keynr.upper(), key.upper()
+        entry = next((entry for entry in self.keys.get((system, ident, keynr), ()) if entry.enabled), None)
+        if entry is not None:
+            if entry.key == key:
+                return None
+            text = _decode(self.lines[entry.line])
+            match = KEY_LINE.match(text.strip())
+            start = len(text) - len(text.lstrip()) + match.start('key')
+            return self._replace(entry.line, text[:start] + key + text[start + len(entry.key):])
+        
+        line = f"{system} {ident} {keynr} {key}" + (f" ;{comment}" if comment else "")
+        group = [entry for entry in self.entries if isinstance(entry, KeyEntry) and entry.system == system]
+        same_ident = [entry for entry in group if entry.ident == ident]
+        return self._insert(self._group_end(same_ident or group), [line])
+    
+    def set_cw(self, caid, sid, cw, provider='000000', pmt='0000', pid='1FFF', channel=None):
+        """Return the hunk setting the control word of a channel, or None when it already has it
+        
+        Like set_key(), an existing enabled entry only has its control word
+        replaced; a new one goes with its channel line after the last entry
+        of its CAID, or at the end.
+        """
+        caid, sid, cw = _hex(caid), _hex(sid), format_cw(cw)
+        entry = next((entry for entry in self.channels.get((caid, sid), ()) if entry.enabled), None)
+        if entry is not None:
+            if entry.cw == cw:
+                return None
+            text = _decode(self.lines[entry.line])
+            match = CW_LINE.match(text.strip())
+            start = len(text) - len(text.lstrip())
+            return self._replace(entry.line, text[:start + match.start('cw')] + cw + text[start + match.end('cw'):])
+        
+        line = f"{caid}:{_hex(provider, 6)}:{sid}:{_hex(pmt)}:{_hex(pid)}:: {cw}"
+        group = [entry for entry in self.entries if isinstance(entry, CwEntry) and entry.caid == caid]
+        return self._insert(self._group_end(group), ([channel] if channel else []) + [line])
+    
+    def apply(self, hunks):
+        """Return a new KeyFile with hunks applied, checking that they match this version"""
+        lines = list(self.lines)
+        # Work back to front so earlier line numbers stay valid
+        for hunk in reversed(sorted(hunks, key=lambda hunk: hunk.offset)):
+            end = hunk.line
+            while self.offsets[end] < hunk.offset + len(hunk.old):
+                end += 1
+            if b''.join(self.lines[hunk.line:end]) != hunk.old or self.offsets[hunk.line] != hunk.offset:
+                raise ValueError(f"Patch does not match line {hunk.line + 1}")
+            lines[hunk.line:end] = re.findall(rb'[^\n]*\n|[^\n]+', hunk.new)
+        return KeyFile(lines, self.path)
+
+def diff(old, new):
+    """Return the hunks turning the KeyFile old into new, changing as few lines as possible"""
+    matcher = difflib.SequenceMatcher(None, old.lines, new.lines, autojunk=False)
+    return [
+        Hunk(i1, old.offsets[i1], b''.join(old.lines[i1:i2]), b''.join(new.lines[j1:j2]))
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal'
+    ]
+
+def patch_file(path, hunks):
+    """Apply hunks to a file, returning the number of bytes written
+    
+    The bytes each hunk replaces are read back and compared first, so a
+    patch made for another version is refused with ValueError before
+    anything is written. When every hunk keeps its length only those bytes
+    are overwritten in place. Otherwise the patched file is written next to
+    the original and moved over it with os.replace(), so a power cut leaves
+    either the old or the new version, never a half-written one.
+    """
+    hunks = sorted(hunks, key=lambda hunk: hunk.offset)
+    with open(path, 'r+b') as f:
+        # Check every hunk against the file
+        for hunk in hunks:
+            f.seek(hunk.offset)
+            if f.read(len(hunk.old)) != hunk.old:
+                raise ValueError(f"{path} does not match the patch at byte {hunk.offset}")
+        
+        # Hunks keeping their length are overwritten in place
+        if all(len(hunk.old) == len(hunk.new) for hunk in hunks):
+            for hunk in hunks:
+                f.seek(hunk.offset)
+                f.write(hunk.new)
+            f.flush()
+            os.fsync(f.fileno())
+            return sum(len(hunk.new) for hunk in hunks)
+        
+        f.seek(0)
+        content = f.read()
+    
+    # Anything else replaces the whole file atomically
+    parts = []
+    position = 0
+    for hunk in hunks:
+        parts.append(content[position:hunk.offset])
+        parts.append(hunk.new)
+        position = hunk.offset + len(hunk.old)
+    parts.append(content[position:])
+    
+    temporary = path + '.part'
+    with open(temporary, 'wb') as f:
+        written = f.write(b''.join(parts))
+        f.flush()
+        os.fsync(f.fileno())
+    shutil.copymode(path, temporary)
+    os.replace(temporary, path)
+    return written
+
+def patch_to_json(hunks):
+    """Return hunks as the text of a JSON patch file"""
+    data = {
+        'version': PATCH_VERSION,
+        'hunks': [
+            {'line': hunk.line, 'offset': hunk.offset,
+             'old': hunk.old.decode('utf-8', 'surrogateescape'), 'new': hunk.new.decode('utf-8', 'surrogateescape')}
+            for hunk in hunks
+        ],
+    }
+    return json.dumps(data, indent=2)
+
+def load_patch(path):
+    """Read the hunks of a JSON patch file, as written by patch_to_json()"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != PATCH_VERSION:
+        raise ValueError(f"{path} is not a version {PATCH_VERSION} patch")
+    return [
+        Hunk(hunk['line'], hunk['offset'],
+             hunk['old'].encode('utf-8', 'surrogateescape'), hunk['new'].encode('utf-8', 'surrogateescape'))
+        for hunk in data['hunks']
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diff and patch SoftCam.Key and constant.cw files")
+    commands = parser.add_subparsers(dest='command', required=True)
+    diff_parser = commands.add_parser('diff', help="write the patch turning OLD into NEW")
+    diff_parser.add_argument('old')
+    diff_parser.add_argument('new')
+    diff_parser.add_argument('-o', '--output', default='-', help="JSON patch file, or - for stdout (default)")
+    apply_parser = commands.add_parser('apply', help="apply a JSON patch to FILE")
+    apply_parser.add_argument('file')
+    apply_parser.add_argument('patch')
+    args = parser.parse_args(argv)
+    
+    try:
+        if args.command == 'diff':
+            hunks = diff(KeyFile.load(args.old), KeyFile.load(args.new))
+            if args.output == '-':
+                print(patch_to_json(hunks))
+            else:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    f.write(patch_to_json(hunks))
+            print(f"{len(hunks)} changes", file=sys.stderr)
+        else:
+            written = patch_file(args.file, load_patch(args.patch))
+            print(f"Wrote {written} bytes to {args.file}", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Tests of the compact index written by the export stage and read by CompactIndex"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Tmdb_scraper
+from compact_index import CompactIndex, write_compact_index
+
+MOVIES = [
+    {
+        'title': 'The Naked Gun(2025)',
+        'search_title': 'The Naked Gun',
+        'url': 'https://www.themoviedb.org/movie/1035259-the-naked-gun',
+        'release_date': '07/30/2025 (US)',
+        'genres': ['Comedy', 'Crime'],
+        'backdrop_urls': ['https://image.tmdb.org/t/p/w1280/a.jpg', 'https://image.tmdb.org/t/p/w1280/b.jpg'],
+    },
+    {
+        'title': 'The Naked Gun: From the Files of Police Squad!',
+        'tmdb_id': '37136',
+        'url': 'https://www.themoviedb.org/movie/37136',
+        'release_date': 'December 2, 1988',
+    },
+    {'title': 'الرِّسَالَة', 'alternative_title': 'The Message', 'tmdb_id': 9, 'url': 'https://www.themoviedb.org/movie/9'},
+    {'title': 'Amélie', 'url': 'https://www.themoviedb.org/movie/194'},
+    {'title': 'A TV show', 'url': 'https://www.themoviedb.org/tv/1399'},
+]
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / 'movies.idx')
+    assert write_compact_index(MOVIES, path) == 4
+    with CompactIndex(path) as index:
+        yield index
+
+def test_get(index):
+    assert len(index) == 4
+    movie = index.get(1035259)
+    assert movie['title'] == 'The Naked Gun(2025)'
+    assert movie['genres'] == 'Comedy, Crime'
+    assert movie['backdrop_url'] == 'https://image.tmdb.org/t/p/w1280/a.jpg'
+    assert index.get('9')['alternative_title'] == 'The Message'
+    assert index.get(194)['title'] == 'Amélie'
+    assert index.get(1) is None
+    assert index.get(99999999) is None
+
+def test_find(index):
+    # Detail titles are found without the year, and by the search card title
+    for title in ('The Naked Gun', 'The Naked Gun(2025)', 'the naked gun (2025)', 'Film: The Naked Gun (2025) HD'):
+        assert [movie['tmdb_id'] for movie in index.find(title)] == ['1035259']
+
+    assert [movie['tmdb_id'] for movie in index.find('the naked gun: from the files of police squad')] == ['37136']
+    assert [movie['tmdb_id'] for movie in index.find('AMELIE')] == ['194']
+    assert [movie['tmdb_id'] for movie in index.find('الرسالة')] == ['9']
+    assert [movie['tmdb_id'] for movie in index.find('the message')] == ['9']
+    assert index.find('A TV show') == []
+    assert index.find('nothing like it') == []
+
+def test_later_duplicate_wins(tmp_path):
+    path = str(tmp_path / 'movies.idx')
+    write_compact_index([{'title': 'Old', 'tmdb_id': '5'}, Tmdb_scraper.Movie(title='New', tmdb_id='5')], path)
+    with CompactIndex(path) as index:
+        assert len(index) == 1
+        assert index.get(5)['title'] == 'New'
+        assert index.find('old') == []
+
+def test_empty_index(tmp_path):
+    path = str(tmp_path / 'empty.idx')
+    write_compact_index([], path)
+    with CompactIndex(path) as index:
+        assert len(index) == 0
+        assert index.get(1) is None
+        assert index.find('anything') == []
+
+def test_invalid_files(tmp_path):
+    path = str(tmp_path / 'bad.idx')
+    with open(path, 'wb') as f:
+        f.write(b'not an index at all')
+    with pytest.raises(ValueError):
+        CompactIndex(path)
+
+    write_compact_index(MOVIES, path)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 10)
+    with pytest.raises(ValueError):
+        CompactIndex(path)
+
+def test_reader_stands_alone():
+    # The box reads the index without loading the scraper and its dependencies
+    code = 'import sys, compact_index; print(sorted({"Tmdb_scraper", "sqlite3", "concurrent.futures"} & set(sys.modules)))'
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
@@ -0,0 +1,121 @@
+"""Tests of EPG title matching: normalize_epg_title, TitleIndex and EpgMatcher"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmark'))
+
+from stand_in_server import StandInServer
+from Tmdb_scraper import (EpgMatcher, MetadataStore, RateLimiter, TitleIndex, TmdbScraper, epg_title_variants,
+                          normalize_epg_title)
+
+NAKED_GUN_2025 = {
+    'title': 'The Naked Gun',
+    'url': 'https://www.themoviedb.org/movie/1035259-the-naked-gun',
+    'release_date': 'July 30, 2025',
+    'tmdb_id': '1035259',
+}
+NAKED_GUN_1988 = {
+    'title': 'The Naked Gun: From the Files of Police Squad!',
+    'url': 'https://www.themoviedb.org/movie/37136-the-naked-gun-from-the-files-of-police-squad',
+    'release_date': 'December 2, 1988',
+    'tmdb_id': '37136',
+}
+NAKED_GUN_1991 = {
+    'title': 'The Naked Gun 2½: The Smell of Fear',
+    'url': 'https://www.themoviedb.org/movie/37137-the-naked-gun-2-the-smell-of-fear',
+    'release_date': 'June 28, 1991',
+    'tmdb_id': '37137',
+}
+
+@pytest.mark.parametrize('title, expected', [
+    ("Film: The Naked Gun (2025) HD", ("the naked gun", 2025)),
+    ("The Naked Gun - 1988", ("the naked gun", 1988)),
+    ("The Naked Gun, 1988", ("the naked gun", 1988)),
+    ("THE NAKED GUN [Premiere] UHD", ("the naked gun", None)),
+    ("Amélie (2001)", ("amelie", 2001)),
+    ("فيلم: الرِّسالة", ("الرساله", None)),
+    # Tags are only stripped at the end, and never leave an empty title
+    ("HD Live Fire", ("hd live fire", None)),
+    ("New Jack City", ("new jack city", None)),
+    ("3D", ("3d", None)),
+    ("", ("", None)),
+])
+def test_normalize_epg_title(title, expected):
+    assert normalize_epg_title(title) == expected
+
+def test_title_variants():
+    assert epg_title_variants("MBC 2: The Naked Gun (2025)") == [
+        ("mbc 2 the naked gun", 2025),
+        ("the naked gun", 2025),
+    ]
+    # A real title with a colon keeps it as the first guess
+    assert epg_title_variants("Mission: Impossible")[0] == ("mission impossible", None)
+
+def test_title_index_lookup():
+    index = TitleIndex([NAKED_GUN_1988, NAKED_GUN_1991, {'title': 'Top Gun', 'tmdb_id': '744'}])
+    # Titles with a colon are also indexed by the part before it
+    assert len(index) == 5
+
+    # The part before the colon finds the 1988 film, short of a full match
+    score, card = index.lookup('the naked gun')[0]
+    assert card['tmdb_id'] == '37136' and score < 1
+    assert [card['tmdb_id'] for _, card in index.lookup('top gun', limit=1)] == ['744']
+    assert index.lookup('xyz') == []
+
+    # The release year breaks ties and pushes far-off years down
+    assert index.lookup('the naked gun', 1988)[0][0] > index.lookup('the naked gun')[0][0]
+    assert index.lookup('the naked gun', 2025)[0][0] < index.lookup('the naked gun')[0][0]
+
+def test_title_index_drops_wrong_years():
+    index = TitleIndex([NAKED_GUN_1988, NAKED_GUN_2025])
+    assert [card['tmdb_id'] for _, card in index.lookup('the naked gun', 2025)] == ['1035259']
+    assert [card['tmdb_id'] for _, card in index.lookup('the naked gun', 1988)] == ['37136']
+    assert len(index.lookup('the naked gun')) == 2
+
+@pytest.fixture
+def server():
+    server = StandInServer()
+    base_url = server.start()
+    yield server, base_url
+    server.stop()
+
+@pytest.fixture
+def scraper(server, tmp_path):
+    _, base_url = server
+    store = MetadataStore(str(tmp_path / 'metadata.db'))
+    scraper = TmdbScraper(base_url=base_url, store=store, rate_limiter=RateLimiter(rate=1000), parse_processes=0)
+    yield scraper
+    store.close()
+
+def searches(server):
+    return server[0].requests.get('search', 0)
+
+def test_match_locally(server, scraper):
+    scraper.store.put_many([NAKED_GUN_1988, NAKED_GUN_2025])
+    matcher = EpgMatcher(scraper)
+    assert matcher.match("The Naked Gun - 1988")['tmdb_id'] == '37136'
+    assert matcher.match("Film: The Naked Gun (2025) HD")['tmdb_id'] == '1035259'
+    assert matcher.match("The Naked Gun (2025)")['tmdb_id'] == '1035259'
+    assert (matcher.local_matches, matcher.searches, searches(server)) == (2, 0, 0)
+
+def test_match_searches_past_the_store_on_a_year_mismatch(server, scraper):
+    # Only the 1988 film is known locally, and the store's own search would return it
+    scraper.store.put_many([NAKED_GUN_1988])
+    matcher = EpgMatcher(scraper)
+    assert matcher.match("Film: The Naked Gun (2025) HD")['tmdb_id'] == '1035259'
+    assert (matcher.local_matches, matcher.searches, searches(server)) == (0, 1, 1)
+
+    # What the search found is stored and indexed for the next event
+    assert scraper.store.get('1035259')['title'] == 'The Naked Gun'
+    assert EpgMatcher(scraper).best_local("The Naked Gun 2025")[1]['tmdb_id'] == '1035259'
+
+def test_match_never_returns_a_year_mismatch(server, scraper):
+    # The site only knows films from 1988, 1991 and 2025
+    matcher = EpgMatcher(scraper)
+    assert matcher.match("The Naked Gun (1965)") is None
+    assert matcher.match("The Naked Gun (1965)") is None
+    assert searches(server) == 1
@@ -0,0 +1,39 @@
+"""Tests of the content-addressed ImageStore"""
+import glob
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Tmdb_scraper import ImageStore
+
+IMAGE = b'\xff\xd8\xff\xe0 not really a JPEG' * 200000
+
+def test_same_content_from_many_urls(tmp_path):
+    urls = [f'https://image.tmdb.org/t/p/w500/poster{number}.jpg' for number in range(16)]
+    barrier = threading.Barrier(len(urls))
+    downloaded = []
+
+    def download(url):
+        downloaded.append(url)
+        # Every download finishes at once, so they all save the same file together
+        barrier.wait()
+        return IMAGE
+
+    store = ImageStore(str(tmp_path), download, workers=len(urls), limit=None)
+    try:
+        images = store.fetch_movie_images({'additional_poster_urls': urls})
+        assert sorted(images) == sorted(urls)
+        paths = {paths['original'] for paths in images.values()}
+        assert len(paths) == 1
+        with open(paths.pop(), 'rb') as f:
+            assert f.read() == IMAGE
+        assert glob.glob(str(tmp_path / '**' / '*.part'), recursive=True) == []
+
+        # Known URLs are not downloaded again
+        assert store.fetch_movie_images({'poster_url': urls[0]}) == {urls[0]: images[urls[0]]}
+        assert len(downloaded) == len(urls)
+    finally:
+        store.close()
@@ -0,0 +1,47 @@
+"""Tests of the local MetadataStore: merging cards and details, and title searches"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Tmdb_scraper import MetadataStore
+
+TOP_GUN = {'title': 'Top Gun', 'tmdb_id': '744', 'overview': 'A naked ambition story', 'release_date': 'May 16, 1986'}
+NAKED_GUN = {'title': 'The Naked Gun: From the Files of Police Squad!', 'tmdb_id': '37136',
+             'alternative_title': 'Y a-t-il un flic pour sauver la reine ?', 'overview': 'Lt. Frank Drebin ...'}
+
+@pytest.fixture
+def store(tmp_path):
+    store = MetadataStore(str(tmp_path / 'metadata.db'))
+    yield store
+    store.close()
+
+def test_search_only_matches_title_columns(store):
+    store.put_many([TOP_GUN])
+    # "naked" is only in the overview, wherever it comes in the query
+    assert store.search('naked gun') == []
+    assert store.search('gun naked') == []
+    assert [movie['tmdb_id'] for movie in store.search('gun')] == ['744']
+    assert [movie['tmdb_id'] for movie in store.search('naked', columns=('overview',))] == ['744']
+
+def test_search_needs_every_word(store):
+    store.put_many([TOP_GUN, NAKED_GUN])
+    assert [movie['tmdb_id'] for movie in store.search('gun naked')] == ['37136']
+    assert [movie['tmdb_id'] for movie in store.search('flic reine')] == ['37136']
+    assert {movie['tmdb_id'] for movie in store.search('GUN')} == {'744', '37136'}
+    assert store.search('...') == []
+
+def test_details_keep_card_fields(store):
+    store.put(NAKED_GUN)
+    store.put_details('37136', {'title': 'The Naked Gun(1988)', 'runtime': '1h 25m', 'tagline': 'You\'ve read the ad'})
+    movie = store.get(37136)
+    assert movie['title'] == NAKED_GUN['title']
+    assert movie['runtime'] == '1h 25m'
+
+    # Details of a movie without a card fill the card fields in
+    store.put_details('744', {'title': 'Top Gun(1986)'})
+    assert store.get('744')['title'] == 'Top Gun(1986)'
+    assert store.get(1) is None
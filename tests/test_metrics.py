@@ -0,0 +1,40 @@
+"""Tests of the ScraperMetrics aggregates and their Prometheus exposition"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Tmdb_scraper import ScraperMetrics
+
+def request(url_class, status=200, cache='miss', total=0.5):
+    return {'type': 'request', 'url': 'https://example.org/', 'url_class': url_class, 'status': status,
+            'cache': cache, 'bytes': 100, 'wait': 0.0, 'total': total}
+
+def test_prometheus_families_are_contiguous():
+    metrics = ScraperMetrics()
+    for event in (request('search'), request('movie', 404), request('movie', cache='hit', total=0.25)):
+        metrics.record(event)
+    metrics.record({'type': 'parse', 'url': 'https://example.org/', 'url_class': 'movie', 'backend': 'lxml',
+                    'bytes': 100, 'parse': 0.125})
+    lines = metrics.to_prometheus().splitlines()
+
+    # Every family is one TYPE line followed by all of its samples
+    families = []
+    for line in lines:
+        if line.startswith('# TYPE '):
+            families.append(line.split()[2])
+        else:
+            assert line.split('{')[0] == families[-1]
+    assert len(families) == len(set(families)) == len(ScraperMetrics.PROMETHEUS_FAMILIES)
+
+    assert 'tmdb_requests_total{url_class="movie",status="404"} 1' in lines
+    assert 'tmdb_cache_requests_total{url_class="movie",cache="hit"} 1' in lines
+    assert 'tmdb_request_errors_total{url_class="movie"} 1' in lines
+    assert 'tmdb_request_errors_total{url_class="search"} 0' in lines
+    assert 'tmdb_request_seconds_total{url_class="movie",phase="total"} 0.750000' in lines
+    assert 'tmdb_request_max_seconds{url_class="movie"} 0.500000' in lines
+    assert 'tmdb_parse_seconds_total{url_class="movie"} 0.125000' in lines
+
+def test_empty_metrics():
+    assert ScraperMetrics().to_prometheus().count('# TYPE ') == len(ScraperMetrics.PROMETHEUS_FAMILIES)
@@ -0,0 +1,72 @@
+"""Tests of TmdbScraper against the stand-in server: coalescing, searches and movie pages"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmark'))
+
+from stand_in_server import StandInServer
+from Tmdb_scraper import PAGE_REGIONS, RateLimiter, TmdbApiScraper, TmdbScraper, parse_movie_cast
+
+MOVIE_URL = '/movie/1035259-the-naked-gun'
+
+@pytest.fixture
+def server():
+    server = StandInServer(latency=0.2)
+    server.start()
+    yield server
+    server.stop()
+
+def make_scraper(server, **options):
+    return TmdbScraper(base_url=server.base_url, rate_limiter=RateLimiter(rate=1000), parse_processes=0, **options)
+
+def scrape_together(calls):
+    """Run the calls at the same time and return their results in order"""
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        return [future.result() for future in [executor.submit(call) for call in calls]]
+
+def test_lambdas_with_different_captures_are_not_coalesced(server):
+    scraper = make_scraper(server)
+    url = server.base_url + MOVIE_URL + '/cast'
+    cast_scraper = lambda limit: lambda: scraper.scrape_page(url, lambda soup: parse_movie_cast(soup, limit=limit),
+                                                              PAGE_REGIONS['cast'])
+    one, six = scrape_together([cast_scraper(1), cast_scraper(6)])
+    assert (len(one), len(six)) == (1, 6)
+    # The download is still shared
+    assert server.requests == {'cast': 1}
+
+def test_equal_partials_are_coalesced(server):
+    scraper = make_scraper(server)
+    url = server.base_url + MOVIE_URL + '/cast'
+    scrape = lambda: scraper.scrape_page(url, partial(parse_movie_cast, limit=2), PAGE_REGIONS['cast'])
+    first, second = scrape_together([scrape, scrape])
+    assert first is second and len(first) == 2
+
+def test_api_movie_is_fetched_once(server):
+    scraper = TmdbApiScraper(api_key='key', api_url=server.base_url + '/3', base_url=server.base_url,
+                             rate_limiter=RateLimiter(rate=1000), parse_processes=0)
+    movie = scraper.get_movie(server.base_url + MOVIE_URL)
+    assert movie.get('rating')
+    assert movie.logos and movie.backdrops and movie.posters and movie.trailers and movie.cast
+    assert movie.to_dict()['title']
+    assert server.requests == {'api_movie': 1}
+
+    assert scraper.scrape_movie_details(server.base_url + MOVIE_URL)['cast'] == movie.cast
+    assert server.requests == {'api_movie': 2}
+
+@pytest.mark.parametrize('max_results, searches', [(2, 1), (3, 1), (4, 2), (None, 2)])
+def test_search_prefetches_only_pages_that_can_be_read(server, max_results, searches):
+    scraper = make_scraper(server)
+    titles = []
+    for movie in scraper.iter_tmdb_movies('the naked gun', max_results=max_results):
+        titles.append(movie['title'])
+        time.sleep(0.05)
+    # The stand-in server answers every page with the same three cards, so the second is all repeats
+    assert len(titles) == min(max_results or 3, 3)
+    assert server.requests == {'search': searches}
@@ -0,0 +1,159 @@
+"""Round-trip tests of softcam_keys: parsing, lookups, diff, apply and patch_file"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import softcam_keys
+from softcam_keys import KeyFile
+
+KEYS = (
+    b"#############################################\r\n"
+    b"#                 VIACCESS 2                #\r\n"
+    b"V 021110 08 35F6B9217C2BA83F38C3C1FD23A5D321 ;Ant-1 Europe(9E)\r\n"
+    b"V 021110 0A AC20DA198FD86EF038FE6AAB26B64B0E ;Ant-1 Europe (9.0E)\r\n"
+    b"---------------------------------------------\r\n"
+    b"#F 00010065 00 62696E39676F7349 ;Bingo Boom HD 1 (55.0\xc2\xb0E)\r\n"
+    b"F 00010065 00 1234569C654321C9 ;AzTV HD (46.0\xc2\xb0E)\r\n"
+    b"F 00010065 00 12AB34F1CD56EF12 ;MBC Maser (21.6\xc2\xb0E)\r\n"
+    b"P 0066 0062fdc0 A8B0077EFE1B23\r\n"
+)
+
+CONSTANT_CW = (
+    b";====================================\n"
+    b"#CAID:PROVIDER:SID:PMT:PID:: XX XX XX XX XX XX XX XX XX XX XX XX XX XX XX XX\n"
+    b"\n"
+    b"MBC Masr (26.0\xc2\xb0E)\n"
+    b"2600:000000:0039:0000:1FFF:: 12 AB 34 F1 CD 56 EF 12 12 AB 34 F1 CD 56 EF 12\n"
+    b"Corallo Sat (7.0\xc2\xb0E)\n"
+    b"#2600:000000:0008:0000:1FFF:: 55 55 55 FF 44 44 44 CC 55 55 55 FF 44 44 44 CC\n"
+    b"Skai (3.0\xc2\xb0E)\n"
+    b"2600:000000:0258:1B5B:1FFF::11 11 11 33 11 11 11 33 11 11 11 33 11 11 11 33"
+)
+
+def write(tmp_path, name, content):
+    path = str(tmp_path / name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_parse_keys():
+    keys = KeyFile(KEYS.splitlines(keepends=True))
+    assert len(keys) == 6
+    assert keys.key('v', '021110', '08') == '35F6B9217C2BA83F38C3C1FD23A5D321'
+    assert keys.key('P', '0066', '0062FDC0') == 'A8B0077EFE1B23'
+
+    # Duplicates stay in file order, the disabled one first but skipped by key()
+    entries = keys.keys[('F', '00010065', '00')]
+    assert [entry.enabled for entry in entries] == [False, True, True]
+    assert keys.key('F', '00010065', '00') == '1234569C654321C9'
+
+    # Offsets count raw bytes, CRLF and UTF-8 included
+    assert keys.size == len(KEYS)
+    for number, line in enumerate(keys.lines):
+        assert KEYS[keys.offsets[number]:keys.offsets[number + 1]] == line
+
+def test_parse_constant_cw():
+    channels = KeyFile(CONSTANT_CW.splitlines(keepends=True))
+    assert len(channels) == 3
+    assert channels.cw(0x2600, 0x39) == '12 AB 34 F1 CD 56 EF 12 12 AB 34 F1 CD 56 EF 12'
+    assert channels.cw('2600', '0258') == '11 11 11 33 11 11 11 33 11 11 11 33 11 11 11 33'
+    assert channels.channels[('2600', '0258')][0].channel == 'Skai (3.0°E)'
+
+    disabled = channels.channels[('2600', '0008')][0]
+    assert not disabled.enabled and disabled.channel == 'Corallo Sat (7.0°E)'
+    assert channels.cw('2600', '0008') is None
+
+def test_repository_files_parse():
+    keys = KeyFile.load(os.path.join(ROOT, 'SoftCam.Key'))
+    channels = KeyFile.load(os.path.join(ROOT, 'constant.cw'))
+    assert keys.size == os.path.getsize(os.path.join(ROOT, 'SoftCam.Key'))
+    assert keys.key('V', '021110', '08') == '35F6B9217C2BA83F38C3C1FD23A5D321'
+    assert channels.cw(0x2600, 0x39) is not None
+
+def test_same_length_key_is_overwritten_in_place(tmp_path):
+    path = write(tmp_path, 'SoftCam.Key', KEYS)
+    keys = KeyFile.load(path)
+    hunk = keys.set_key('V', '021110', '08', '00112233445566778899AABBCCDDEEFF')
+    assert hunk.new == b"V 021110 08 00112233445566778899AABBCCDDEEFF ;Ant-1 Europe(9E)\r\n"
+
+    inode = os.stat(path).st_ino
+    assert softcam_keys.patch_file(path, [hunk]) == len(hunk.new)
+    assert os.stat(path).st_ino == inode
+    assert read(path) == b''.join(keys.apply([hunk]).lines)
+    assert KeyFile.load(path).key('V', '021110', '08') == '00112233445566778899AABBCCDDEEFF'
+    assert keys.set_key('V', '021110', '0A', 'AC20DA198FD86EF038FE6AAB26B64B0E') is None
+
+def test_insert_replaces_the_file(tmp_path):
+    path = write(tmp_path, 'SoftCam.Key', KEYS)
+    keys = KeyFile.load(path)
+    hunks = [
+        keys.set_key('V', '021110', '0B', '9F59AF7B9AA16EEC3CDAA95BA43D876D', 'Ant-1 Europe'),
+        keys.set_key('S', '0001', '00', '2222222222222222'),
+    ]
+    # The new key goes after its group, with the file's line ending
+    assert hunks[0].line == 4 and hunks[0].new.endswith(b"\r\n")
+
+    softcam_keys.patch_file(path, hunks)
+    assert read(path) == b''.join(keys.apply(hunks).lines)
+    assert not os.path.exists(path + '.part')
+    patched = KeyFile.load(path)
+    assert patched.key('V', '021110', '0B') == '9F59AF7B9AA16EEC3CDAA95BA43D876D'
+    assert patched.key('S', '0001', '00') == '2222222222222222'
+
+def test_append_without_final_newline(tmp_path):
+    path = write(tmp_path, 'constant.cw', CONSTANT_CW)
+    channels = KeyFile.load(path)
+    hunk = channels.set_cw('2600', '0FFF', '11' * 16, channel='New Channel (1.0°E)')
+    softcam_keys.patch_file(path, [hunk])
+
+    assert read(path) == CONSTANT_CW + (
+        b"\nNew Channel (1.0\xc2\xb0E)\n2600:000000:0FFF:0000:1FFF:: 11 11 11 11 11 11 11 11 11 11 11 11 11 11 11 11\n"
+    )
+    patched = KeyFile.load(path)
+    assert patched.channels[('2600', '0FFF')][0].channel == 'New Channel (1.0°E)'
+    assert patched.cw('2600', '0258') == channels.cw('2600', '0258')
+
+def test_disabled_entry_is_not_changed(tmp_path):
+    path = write(tmp_path, 'constant.cw', CONSTANT_CW)
+    channels = KeyFile.load(path)
+    # Setting a disabled channel adds an enabled entry instead of editing the commented one
+    hunk = channels.set_cw('2600', '0008', '01' * 16)
+    assert b'#2600' not in hunk.old
+    softcam_keys.patch_file(path, [hunk])
+    patched = KeyFile.load(path)
+    assert [entry.enabled for entry in patched.channels[('2600', '0008')]] == [False, True]
+    assert patched.cw('2600', '0008') == ' '.join(['01'] * 16)
+
+def test_diff_and_patch_round_trip(tmp_path):
+    new_keys = (KEYS
+                .replace(b"AC20DA198FD86EF038FE6AAB26B64B0E", b"00000000000000000000000000000000")
+                .replace(b"#F 00010065 00", b"F 00010065 00")
+                .replace(b"P 0066 0062fdc0 A8B0077EFE1B23\r\n", b""))
+    new_keys += b"N 1102 00 F8780ECD862D143B9B23ECFFCBB872A4 ;UnityMedia\r\n"
+    path = write(tmp_path, 'SoftCam.Key', KEYS)
+    old, new = KeyFile.load(path), KeyFile(new_keys.splitlines(keepends=True))
+
+    hunks = softcam_keys.diff(old, new)
+    assert b''.join(old.apply(hunks).lines) == new_keys
+
+    # Through the JSON patch format, as pushed to a box
+    patch = write(tmp_path, 'patch.json', softcam_keys.patch_to_json(hunks).encode('utf-8'))
+    softcam_keys.patch_file(path, softcam_keys.load_patch(patch))
+    assert read(path) == new_keys
+
+    # A second application no longer matches and leaves the file alone
+    with pytest.raises(ValueError):
+        softcam_keys.patch_file(path, hunks)
+    assert read(path) == new_keys
+
+def test_invalid_control_word():
+    with pytest.raises(ValueError):
+        softcam_keys.format_cw('12 3')